@@ -0,0 +1,45 @@
+"""
+Compares two benchmark result files.
+
+    python -m benchmarks.compare benchmarks/results/before.json benchmarks/results/after.json
+"""
+import argparse
+import json
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"{before['revision']} -> {after['revision']}")
+    print(f"  {'rps':<34} {before['rps']:>10} {after['rps']:>10} {change(before['rps'], after['rps']):>9}")
+    print(
+        f"  {'db_statements_per_request':<34} {before['db_statements_per_request']:>10} "
+        f"{after['db_statements_per_request']:>10} "
+        f"{change(before['db_statements_per_request'], after['db_statements_per_request']):>9}"
+    )
+    for name in sorted(set(before["endpoints"]) | set(after["endpoints"])):
+        old, new = before["endpoints"].get(name, {}), after["endpoints"].get(name, {})
+        for metric in METRICS:
+            if metric in old and metric in new:
+                label = f"{name}.{metric}"
+                print(f"  {label:<34} {old[metric]:>10} {new[metric]:>10} {change(old[metric], new[metric]):>9}")
+
+
+if __name__ == "__main__":
+    main()
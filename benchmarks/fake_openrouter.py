@@ -0,0 +1,102 @@
+"""
+Local stand-in for the OpenRouter chat completions API.
+
+Answers every request after a configurable delay, either as one JSON body or
+as an SSE stream when the payload asks for `stream: true`. Latency and error
+rate can be overridden per model to exercise hedging and fallback. Run it on its own
+with `python -m benchmarks.fake_openrouter --port 8090` and point
+OPENROUTER_BASE_URL at http://127.0.0.1:8090/api/v1/chat/completions.
+"""
+import argparse
+import asyncio
+import json
+import random
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+UNKNOWN_ANSWER = (
+    "I don't know the answer to that question yet, but don't worry! Please reach back out "
+    "in the next 24-48 hours as I will inform our admin team to provide you with an accurate answer."
+)
+
+
+def create_app(
+    latency_ms: float = 800.0,
+    jitter_ms: float = 200.0,
+    token_delay_ms: float = 20.0,
+    unknown_rate: float = 0.1,
+    model_latency_ms: Optional[Dict[str, float]] = None,
+    model_error_rate: Optional[Dict[str, float]] = None,
+) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.requests_by_model = {}
+    model_latency_ms = model_latency_ms or {}
+    model_error_rate = model_error_rate or {}
+
+    def reply_for(payload: dict) -> str:
+        if random.random() < unknown_rate:
+            return UNKNOWN_ANSWER
+        question = payload["messages"][-1]["content"]
+        return f"Thanks for asking about '{question[:60]}'. Here is what the handbook says about it."
+
+    @app.post("/api/v1/chat/completions")
+    async def completions(request: Request):
+        payload = await request.json()
+        model = payload.get("model", "")
+        app.state.requests += 1
+        app.state.requests_by_model[model] = app.state.requests_by_model.get(model, 0) + 1
+        reply = reply_for(payload)
+        await asyncio.sleep(max(random.gauss(model_latency_ms.get(model, latency_ms), jitter_ms), 0) / 1000)
+        if random.random() < model_error_rate.get(model, 0.0):
+            return JSONResponse({"error": {"message": "Provider returned error"}}, status_code=502)
+
+        if not payload.get("stream"):
+            return {"choices": [{"message": {"role": "assistant", "content": reply}}]}
+
+        async def events():
+            yield ": OPENROUTER PROCESSING\n\n"
+            for word in reply.split(" "):
+                chunk = {"choices": [{"delta": {"content": word + " "}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_delay_ms / 1000)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def parse_overrides(items) -> Dict[str, float]:
+    """Turns ["model=value", ...] into {"model": value}."""
+    overrides = {}
+    for item in items:
+        model, _, value = item.rpartition("=")
+        overrides[model] = float(value)
+    return overrides
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=200.0)
+    parser.add_argument("--token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--unknown-rate", type=float, default=0.1)
+    parser.add_argument("--model-latency-ms", action="append", default=[], metavar="MODEL=MS")
+    parser.add_argument("--model-error-rate", action="append", default=[], metavar="MODEL=RATE")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(
+            args.latency_ms, args.jitter_ms, args.token_delay_ms, args.unknown_rate,
+            parse_overrides(args.model_latency_ms), parse_overrides(args.model_error_rate),
+        ),
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+    )
@@ -0,0 +1,313 @@
+"""
+Offline load test for the chat endpoints.
+
+Starts the fake OpenRouter server and the real app in-process on SQLite,
+seeds the knowledge base, then has simulated students sign up, send a
+conversation's worth of messages and page their history, all concurrently.
+Latency percentiles, throughput and the number of SQL statements the app ran
+are written to a JSON file so runs can be compared across commits with
+`python -m benchmarks.compare`.
+
+    python -m benchmarks.run --students 50 --messages 5 --llm-latency-ms 800
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import List
+
+import httpx
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+TOPICS = [
+    "tuition fees", "the application deadline", "hostel accommodation", "the exam timetable",
+    "course registration", "scholarships", "the academic calendar", "transcript requests",
+    "the library opening hours", "thesis supervision", "part-time study", "the admission requirements",
+    "student ID cards", "the orientation week", "late registration penalties", "deferring admission",
+]
+
+TEMPLATES = [
+    "What is {topic}?",
+    "Can you tell me about {topic}?",
+    "How do I find out about {topic}?",
+    "Where can I get information on {topic} for the MIT program?",
+]
+
+
+def configure_environment(args, llm_url: str, database_url: str):
+    # Must run before anything under src/ is imported, since Settings is
+    # instantiated at import time
+    os.environ.update({
+        "ENVIRONMENT": "development",
+        "LOG_LEVEL": args.log_level,
+        "DATABASE_URL": database_url,
+        "OPENROUTER_API_KEY": "benchmark",
+        "OPENROUTER_BASE_URL": llm_url,
+        "LLM_MODELS": json.dumps(args.llm_models.split(",")),
+        "SMTP_USERNAME": "",
+        "SMTP_PASSWORD": "",
+        "ADMIN_EMAIL": "",
+        # The seeded questions are the ones students ask, so with direct
+        # answers on almost nothing would reach the LLM path
+        "DIRECT_ANSWER_ENABLED": "true" if args.direct_answers else "false",
+    })
+    if not args.rate_limits:
+        # Every simulated student connects from 127.0.0.1
+        os.environ.update({
+            "RATE_LIMIT_MESSAGE_PER_MINUTE": "0",
+            "RATE_LIMIT_MESSAGE_IP_PER_MINUTE": "0",
+            "RATE_LIMIT_AUTH_IP_PER_MINUTE": "0",
+        })
+
+
+def percentiles(samples: List[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(p: float) -> float:
+        return round(ordered[min(int(p * len(ordered)), len(ordered) - 1)], 2)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 2),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def start_server(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    # Signal handling is left to the benchmark process itself
+    server.install_signal_handlers = lambda: None
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def wait_until_ready(url: str, timeout: float):
+    # Warm-up runs in the background; the schema only exists once it is done
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while (await client.get(url)).status_code != 200:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"app not ready after {timeout}s")
+            await asyncio.sleep(0.1)
+
+
+async def seed_knowledge_base(count: int):
+    from sqlalchemy import insert
+
+    from src.database import SessionLocal
+    from src.entities import QAEntry
+    from src.knowledge_base import bump_version, load_knowledge_base
+
+    rows = [
+        {
+            "question": template.format(topic=topic) + (f" ({n})" if n else ""),
+            "answer": f"Everything you need to know about {topic} is on the program portal, entry {n}.",
+        }
+        for n in range(max(count // (len(TOPICS) * len(TEMPLATES)), 1))
+        for topic in TOPICS
+        for template in TEMPLATES
+    ][:count]
+    async with SessionLocal() as db:
+        await db.execute(insert(QAEntry), rows)
+        await bump_version(db)
+        await db.commit()
+        # The app warmed up against an empty table; pick the seed up right away
+        await load_knowledge_base(db)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, List[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            response.raise_for_status()
+            if name == "message_stream":
+                await response.aread()
+        except httpx.HTTPStatusError as e:
+            key = f"{name}:{e.response.status_code}"
+            self.errors[key] = self.errors.get(key, 0) + 1
+            return None
+        except httpx.HTTPError:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return None
+        self.latencies.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+        return response
+
+
+async def simulate_student(client: httpx.AsyncClient, recorder: Recorder, index: int, args, rng: random.Random):
+    response = await recorder.call(
+        client, "auth_student", "POST", "/api/auth/student",
+        json={"username": f"bench-{index}-{rng.getrandbits(32):08x}", "is_existing_student": rng.random() < 0.5},
+    )
+    if response is None:
+        return
+    identifier = response.json()["data"]["unique_identifier"]
+
+    for _ in range(args.messages):
+        # A small question pool makes repeats (and cache hits) as common as they are in practice
+        question = rng.choice(TEMPLATES[:args.question_variety]).format(topic=rng.choice(TOPICS))
+        if args.stream:
+            await recorder.call(
+                client, "message_stream", "POST", "/api/message/stream",
+                json={"content": question, "user_identifier": identifier},
+            )
+        else:
+            await recorder.call(
+                client, "message", "POST", "/api/message",
+                json={"content": question, "user_identifier": identifier},
+            )
+        if args.think_time_ms:
+            await asyncio.sleep(rng.uniform(0, 2 * args.think_time_ms) / 1000)
+
+    await recorder.call(client, "history", "GET", f"/api/messages/{identifier}")
+
+
+async def run(args) -> dict:
+    from benchmarks.fake_openrouter import create_app as create_fake_llm, parse_overrides
+
+    workdir = tempfile.mkdtemp(prefix="chatbot-bench-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    llm_url = f"http://127.0.0.1:{args.llm_port}/api/v1/chat/completions"
+    configure_environment(args, llm_url, database_url)
+
+    from sqlalchemy import event
+
+    from src.database import engine
+    from src.main import app
+
+    statements = {"count": 0}
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements["count"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+
+    fake_llm = create_fake_llm(
+        args.llm_latency_ms, args.llm_jitter_ms, args.token_delay_ms, args.unknown_rate,
+        parse_overrides(args.model_latency_ms), parse_overrides(args.model_error_rate),
+    )
+    llm_server, llm_task = await start_server(fake_llm, args.llm_port)
+    app_server, app_task = await start_server(app, args.app_port)
+
+    try:
+        await wait_until_ready(f"http://127.0.0.1:{args.app_port}/readyz", args.timeout)
+        await seed_knowledge_base(args.qa_entries)
+        statements["count"] = 0
+
+        recorder = Recorder()
+        rng = random.Random(args.seed)
+        gate = asyncio.Semaphore(args.concurrency)
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.app_port}", limits=limits, timeout=args.timeout
+        ) as client:
+            async def student(index: int):
+                async with gate:
+                    await simulate_student(client, recorder, index, args, random.Random(rng.random()))
+
+            started = time.perf_counter()
+            await asyncio.gather(*(student(index) for index in range(args.students)))
+            elapsed = time.perf_counter() - started
+    finally:
+        app_server.should_exit = True
+        llm_server.should_exit = True
+        await asyncio.gather(app_task, llm_task)
+
+    total_requests = sum(len(samples) for samples in recorder.latencies.values())
+    return {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "elapsed_s": round(elapsed, 3),
+        "requests": total_requests,
+        "rps": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        "errors": recorder.errors,
+        "llm_calls": fake_llm.state.requests,
+        "llm_calls_by_model": fake_llm.state.requests_by_model,
+        "db_statements": statements["count"],
+        "db_statements_per_request": round(statements["count"] / total_requests, 2) if total_requests else 0.0,
+        "endpoints": {name: percentiles(samples) for name, samples in sorted(recorder.latencies.items())},
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the chat endpoints")
+    parser.add_argument("--students", type=int, default=50, help="simulated students")
+    parser.add_argument("--messages", type=int, default=5, help="messages each student sends")
+    parser.add_argument("--concurrency", type=int, default=25, help="students active at once")
+    parser.add_argument("--think-time-ms", type=float, default=0.0, help="mean pause between messages")
+    parser.add_argument("--question-variety", type=int, default=len(TEMPLATES), choices=range(1, len(TEMPLATES) + 1))
+    parser.add_argument("--stream", action="store_true", help="use POST /message/stream")
+    parser.add_argument("--qa-entries", type=int, default=500, help="knowledge base size to seed")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200.0)
+    parser.add_argument("--token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--unknown-rate", type=float, default=0.1, help="share of replies that escalate")
+    parser.add_argument("--llm-models", default="fake/primary,fake/secondary", help="comma-separated LLM_MODELS")
+    parser.add_argument("--model-latency-ms", action="append", default=[], metavar="MODEL=MS")
+    parser.add_argument("--model-error-rate", action="append", default=[], metavar="MODEL=RATE")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the app's rate limits on")
+    parser.add_argument("--direct-answers", action="store_true", help="answer close knowledge-base matches without the LLM")
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    parser.add_argument("--app-port", type=int, default=8089)
+    parser.add_argument("--llm-port", type=int, default=8090)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="result file, defaults to benchmarks/results/<timestamp>-<revision>.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(run(args))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{result['revision']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"{result['requests']} requests in {result['elapsed_s']}s ({result['rps']} req/s), "
+          f"{result['db_statements_per_request']} SQL statements per request")
+    for name, stats in result["endpoints"].items():
+        print(f"  {name:<16} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms n={stats['count']}")
+    if result["errors"]:
+        print(f"  errors: {result['errors']}")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
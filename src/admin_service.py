@@ -1,11 +1,12 @@
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
+from typing import Optional
+import time
+import anyio
 import bcrypt
 import jwt
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from cachetools import TLRUCache
 from contextlib import asynccontextmanager
 
 from src.config import settings
@@ -14,58 +15,62 @@ import logging
 logger = logging.getLogger(__name__)
 
 JWT_SECRET = settings.JWT_SECRET
-SMTP_SERVER = settings.SMTP_SERVER
-SMTP_PASSWORD = settings.SMTP_PASSWORD
-SMTP_PORT = settings.SMTP_PORT
-SMTP_USERNAME = settings.SMTP_USERNAME
-ADMIN_EMAIL = settings.ADMIN_EMAIL
 
 
 
 security = HTTPBearer()
 
-def hash_password(password: str) -> str:
+_password_limiter: Optional[anyio.CapacityLimiter] = None
+
+# Verified payloads by token, each dropped at TOKEN_CACHE_TTL_SECONDS or the
+# token's own exp, whichever comes first
+_verified_tokens: TLRUCache = TLRUCache(
+    maxsize=settings.TOKEN_CACHE_SIZE,
+    ttu=lambda token, payload, now: min(now + settings.TOKEN_CACHE_TTL_SECONDS, payload["exp"]),
+    timer=time.time,
+)
+
+
+def get_password_limiter() -> anyio.CapacityLimiter:
+    # Created on first use, inside the running event loop
+    global _password_limiter
+    if _password_limiter is None:
+        _password_limiter = anyio.CapacityLimiter(settings.PASSWORD_HASH_MAX_CONCURRENCY)
+    return _password_limiter
+
+
+def _hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
-def verify_password(password: str, hashed: str) -> bool:
+def _verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+async def hash_password(password: str) -> str:
+    # bcrypt is deliberately slow; keep it off the event loop and cap how many run at once
+    return await anyio.to_thread.run_sync(_hash_password, password, limiter=get_password_limiter())
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await anyio.to_thread.run_sync(_verify_password, password, hashed, limiter=get_password_limiter())
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now() + timedelta(days=90)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, JWT_SECRET, algorithm="HS256")
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=["HS256"])
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    payload = _verified_tokens.get(token)
+    if payload is not None:
         return payload
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
     except jwt.ExpiredSignatureError:
         logger.error("Token expired")
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         logger.error("Invalid token")
         raise HTTPException(status_code=401, detail="Invalid token")
-
-async def send_email_notification(subject: str, body: str):
-    if not all([SMTP_USERNAME, SMTP_PASSWORD, ADMIN_EMAIL]):
-        logger.warning("Email configuration missing")
-        return
-    
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = SMTP_USERNAME
-        msg['To'] = ADMIN_EMAIL
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(SMTP_USERNAME, ADMIN_EMAIL, text)
-        server.quit()
-        logger.info("Email sent successfully")
-    except Exception as e:
-        logger.error(f"Email sending failed: {e}")
+    if "exp" in payload:
+        _verified_tokens[token] = payload
+    return payload
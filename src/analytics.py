@@ -0,0 +1,225 @@
+import bisect
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import Date, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.entities import DailyStats, Message, StudentActivity, TimeToAnswerBucket, UnansweredCluster, UnansweredQuestion
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the time-to-answer histogram; one more bucket
+# past the last holds everything slower
+TIME_TO_ANSWER_BUCKETS = (
+    60, 5 * 60, 15 * 60, 30 * 60, 60 * 60, 3 * 3600, 6 * 3600, 12 * 3600,
+    86400, 2 * 86400, 3 * 86400, 7 * 86400, 14 * 86400, 30 * 86400,
+)
+
+DAILY_COUNTERS = (
+    "questions", "escalations", "fallbacks", "direct_answers", "cached_answers",
+    "active_students", "questions_answered",
+)
+
+
+def _insert(db: AsyncSession):
+    # Upserts are spelled per dialect; these are the two the app runs on
+    return postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+
+
+async def bump_daily_stats(db: AsyncSession, day: date, **counts):
+    """Adds the counts to the day's row, creating it if needed."""
+    stmt = _insert(db)(DailyStats).values(day=day, **counts)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[DailyStats.day],
+        set_={name: getattr(DailyStats, name) + stmt.excluded[name] for name in counts},
+    ))
+
+
+async def mark_active(db: AsyncSession, user_id: int, day: date) -> bool:
+    """Records the student as active on `day`. True if they hadn't been yet."""
+    stmt = _insert(db)(StudentActivity).values(user_id=user_id, last_active_on=day)
+    result = await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[StudentActivity.user_id],
+            set_={"last_active_on": stmt.excluded.last_active_on},
+            where=StudentActivity.last_active_on < stmt.excluded.last_active_on,
+        ).returning(StudentActivity.id)
+    )
+    return result.first() is not None
+
+
+async def record_exchange(db: AsyncSession, day: date, user_id: int, outcome: str, source: str):
+    counts = {"questions": 1}
+    if outcome == "escalated":
+        counts["escalations"] = 1
+    elif outcome == "fallback":
+        counts["fallbacks"] = 1
+    if source == "fast_path":
+        counts["direct_answers"] = 1
+    elif source == "cache":
+        counts["cached_answers"] = 1
+    if await mark_active(db, user_id, day):
+        counts["active_students"] = 1
+    await bump_daily_stats(db, day, **counts)
+
+
+async def record_answers(db: AsyncSession, rows: Iterable[Tuple[datetime, datetime]]):
+    """
+    Adds (created_at, answered_at) pairs of newly answered questions to the
+    rollups of the day each was answered. Call it in the answering transaction.
+    """
+    totals: dict[date, list] = {}
+    buckets: dict[tuple, int] = {}
+    for created_at, answered_at in rows:
+        if created_at is None or answered_at is None:
+            continue
+        waited = max((answered_at - created_at).total_seconds(), 0.0)
+        day = answered_at.date()
+        day_totals = totals.setdefault(day, [0, 0.0])
+        day_totals[0] += 1
+        day_totals[1] += waited
+        key = (day, bisect.bisect_left(TIME_TO_ANSWER_BUCKETS, waited))
+        buckets[key] = buckets.get(key, 0) + 1
+
+    for day, (count, seconds) in totals.items():
+        await bump_daily_stats(db, day, questions_answered=count, time_to_answer_seconds=seconds)
+    for (day, bucket), count in buckets.items():
+        stmt = _insert(db)(TimeToAnswerBucket).values(day=day, bucket=bucket, count=count)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[TimeToAnswerBucket.day, TimeToAnswerBucket.bucket],
+            set_={"count": TimeToAnswerBucket.count + stmt.excluded["count"]},
+        ))
+
+
+def histogram_quantile(counts: List[int], quantile: float) -> Optional[Tuple[float, Optional[float]]]:
+    """
+    Finds the time-to-answer histogram bucket a quantile falls in and returns
+    its (lower, upper) bounds in seconds; upper is None for the open-ended
+    last bucket. The buckets are too coarse to pick a point within one.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = quantile * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            lower = TIME_TO_ANSWER_BUCKETS[index - 1] if index else 0
+            upper = TIME_TO_ANSWER_BUCKETS[index] if index < len(TIME_TO_ANSWER_BUCKETS) else None
+            return float(lower), float(upper) if upper is not None else None
+        cumulative += count
+    return None
+
+
+def _rate(part: int, whole: int) -> float:
+    return round(part / whole, 4) if whole else 0.0
+
+
+async def get_analytics(db: AsyncSession, days: int) -> dict:
+    """
+    Reads the dashboard from the rollup tables only: at most one row per day
+    in the window, plus one per histogram bucket and the top open clusters,
+    however much history there is.
+    """
+    today = date.today()
+    start = today - timedelta(days=days - 1)
+
+    stats = {
+        row.day: row
+        for row in (await db.scalars(select(DailyStats).where(DailyStats.day >= start))).all()
+    }
+    bucket_counts = [0] * (len(TIME_TO_ANSWER_BUCKETS) + 1)
+    for bucket, count in await db.execute(
+        select(TimeToAnswerBucket.bucket, func.sum(TimeToAnswerBucket.count))
+        .where(TimeToAnswerBucket.day >= start)
+        .group_by(TimeToAnswerBucket.bucket)
+    ):
+        bucket_counts[bucket] = int(count)
+    clusters = (
+        await db.scalars(
+            select(UnansweredCluster)
+            .where(UnansweredCluster.is_answered == False)
+            .order_by(UnansweredCluster.question_count.desc(), UnansweredCluster.id)
+            .limit(settings.ANALYTICS_TOP_UNANSWERED)
+        )
+    ).all()
+
+    daily = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = stats.get(day)
+        counts = {name: getattr(row, name) if row else 0 for name in DAILY_COUNTERS}
+        daily.append({"day": day, **counts, "escalation_rate": _rate(counts["escalations"], counts["questions"])})
+
+    totals = {name: sum(entry[name] for entry in daily) for name in DAILY_COUNTERS if name != "active_students"}
+    waited = sum(row.time_to_answer_seconds for row in stats.values())
+    median = histogram_quantile(bucket_counts, 0.5)
+    totals.update({
+        "escalation_rate": _rate(totals["escalations"], totals["questions"]),
+        "average_daily_active_students": round(sum(entry["active_students"] for entry in daily) / days, 2),
+        "median_time_to_answer_range_seconds": {"from": median[0], "to": median[1]} if median is not None else None,
+        "mean_time_to_answer_seconds": round(waited / totals["questions_answered"], 1) if totals["questions_answered"] else None,
+    })
+
+    return {
+        "from": start,
+        "to": today,
+        "totals": totals,
+        "daily": daily,
+        "top_unanswered": [
+            {
+                "cluster_id": cluster.id,
+                "question": cluster.question,
+                "question_count": cluster.question_count,
+                "created_at": cluster.created_at,
+            }
+            for cluster in clusters
+        ],
+    }
+
+
+async def backfill_daily_stats(db: AsyncSession) -> int:
+    """
+    Fills in the days before rollups were collected from the messages and
+    unanswered_questions tables, with full scans, so it is meant to be run
+    once. Only days before the first one already in daily_stats are
+    written, so nothing is counted twice. Archived messages aren't included,
+    and fallbacks, direct and cached answers weren't recorded before, so
+    those stay at zero.
+    """
+    first_day = await db.scalar(select(func.min(DailyStats.day))) or date.today()
+    cutoff = datetime.combine(first_day, time.min)
+
+    counts: dict[date, dict] = {}
+    message_day = func.date(Message.created_at, type_=Date)
+    for day, questions, students in await db.execute(
+        select(message_day, func.count(), func.count(Message.user_id.distinct()))
+        .where(Message.is_bot == False, Message.created_at < cutoff)
+        .group_by(message_day)
+    ):
+        counts.setdefault(day, {}).update(questions=questions, active_students=students)
+
+    question_day = func.date(UnansweredQuestion.created_at, type_=Date)
+    for day, escalations in await db.execute(
+        select(question_day, func.count())
+        .where(UnansweredQuestion.created_at < cutoff)
+        .group_by(question_day)
+    ):
+        counts.setdefault(day, {})["escalations"] = escalations
+
+    for day, day_counts in counts.items():
+        await bump_daily_stats(db, day, **day_counts)
+
+    answered = await db.execute(
+        select(UnansweredQuestion.created_at, UnansweredQuestion.answered_at)
+        .where(UnansweredQuestion.answered_at < cutoff)
+    )
+    await record_answers(db, answered.all())
+    await db.commit()
+
+    logger.info(f"Backfilled analytics for {len(counts)} days before {first_day}")
+    return len(counts)
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.database import SessionLocal
+from src.entities import ArchivedMessageRange, Message, MessageArchive
+from src.ingestion import iterate_in_thread
+import logging
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLUMNS = ["id", "user_id", "content", "is_bot", "created_at"]
+
+# Rows are sorted by user before writing, so row-group statistics let a
+# per-user read skip most of a file
+ROW_GROUP_SIZE = 1000
+
+EXPORT_BATCH_SIZE = 1000
+
+_archive_lock: Optional[asyncio.Lock] = None
+_archiver_task: Optional[asyncio.Task] = None
+
+
+def archive_path(filename: str) -> str:
+    return os.path.join(settings.ARCHIVE_DIR, filename)
+
+
+def temporary_path(filename: str) -> str:
+    return archive_path(filename) + ".tmp"
+
+
+def resolve_archive(filename: str) -> str:
+    """
+    Path of a committed archive file. A worker that died between committing
+    the archive row and renaming its file leaves the temporary file behind;
+    it is complete, so it is moved into place here.
+    """
+    path = archive_path(filename)
+    if not os.path.exists(path) and os.path.exists(temporary_path(filename)):
+        os.replace(temporary_path(filename), path)
+    return path
+
+
+def write_archive(rows: List[dict], path: str) -> int:
+    frame = pd.DataFrame(rows, columns=ARCHIVE_COLUMNS).sort_values(["user_id", "created_at", "id"])
+    # Microsecond precision reads back as plain datetimes, matching the database
+    frame["created_at"] = pd.to_datetime(frame["created_at"]).astype("datetime64[us]")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    frame.to_parquet(
+        path,
+        index=False,
+        compression=settings.ARCHIVE_COMPRESSION,
+        row_group_size=ROW_GROUP_SIZE,
+    )
+    return os.path.getsize(path)
+
+
+def user_ranges(rows: List[dict]) -> List[dict]:
+    ranges = {}
+    for row in rows:
+        entry = ranges.get(row["user_id"])
+        if entry is None:
+            ranges[row["user_id"]] = {
+                "user_id": row["user_id"],
+                "message_count": 1,
+                "oldest_created_at": row["created_at"],
+                "newest_created_at": row["created_at"],
+            }
+        else:
+            entry["message_count"] += 1
+            entry["oldest_created_at"] = min(entry["oldest_created_at"], row["created_at"])
+            entry["newest_created_at"] = max(entry["newest_created_at"], row["created_at"])
+    return list(ranges.values())
+
+
+async def archive_batch(cutoff: datetime) -> int:
+    """
+    Moves the oldest ARCHIVE_BATCH_SIZE messages created before the cutoff
+    into a new Parquet file. Returns how many were moved, or 0 when there
+    is nothing left or another worker is archiving the same messages.
+
+    The rows are read, deleted and recorded in one transaction. On
+    PostgreSQL they are locked as they are read and rows another worker
+    holds are skipped; elsewhere a worker that loses the race finds fewer
+    rows to delete than it read and rolls back. The file goes to a
+    temporary name unique to this attempt and is only renamed into place
+    after the commit, so a rolled-back attempt never touches a file
+    another worker committed.
+    """
+    # Ids aren't stable enough to name files by: SQLite reuses them once the
+    # newest rows have been deleted
+    filename = f"messages-{uuid.uuid4().hex}.parquet"
+    temp_path = temporary_path(filename)
+
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(*(getattr(Message, column) for column in ARCHIVE_COLUMNS))
+            .where(Message.created_at < cutoff)
+            .order_by(Message.id)
+            .limit(settings.ARCHIVE_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )
+        rows = [row._asdict() for row in result]
+        if not rows:
+            return 0
+        min_id, max_id = rows[0]["id"], rows[-1]["id"]
+
+        try:
+            size = await asyncio.to_thread(write_archive, rows, temp_path)
+            # Every message in the id range that is past the cutoff is in this
+            # batch, so anything other than an exact match means another worker
+            # got to some of them first
+            deleted = await db.execute(
+                delete(Message).where(
+                    Message.id >= min_id, Message.id <= max_id, Message.created_at < cutoff
+                )
+            )
+            if deleted.rowcount != len(rows):
+                await db.rollback()
+                os.remove(temp_path)
+                logger.info(f"Messages {min_id}-{max_id} are being archived by another worker, skipping")
+                return 0
+
+            archive_id = await db.scalar(
+                insert(MessageArchive).values(
+                    filename=filename,
+                    message_count=len(rows),
+                    min_message_id=min_id,
+                    max_message_id=max_id,
+                    oldest_created_at=min(row["created_at"] for row in rows),
+                    newest_created_at=max(row["created_at"] for row in rows),
+                    size_bytes=size,
+                ).returning(MessageArchive.id)
+            )
+            await db.execute(
+                insert(ArchivedMessageRange),
+                [{"archive_id": archive_id, **entry} for entry in user_ranges(rows)],
+            )
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        # If the commit itself fails its outcome is unknown, so the file is
+        # kept; resolve_archive() moves it into place if the row did commit
+        await db.commit()
+
+    os.replace(temp_path, archive_path(filename))
+    logger.info(f"Archived {len(rows)} messages to {filename} ({size} bytes)")
+    return len(rows)
+
+
+async def archive_old_messages() -> dict:
+    """Archives every message older than MESSAGE_RETENTION_DAYS, one batch at a time."""
+    global _archive_lock
+    if _archive_lock is None:
+        _archive_lock = asyncio.Lock()
+
+    cutoff = datetime.now() - timedelta(days=settings.MESSAGE_RETENTION_DAYS)
+    archived, files = 0, 0
+    async with _archive_lock:
+        while True:
+            moved = await archive_batch(cutoff)
+            if not moved:
+                break
+            archived += moved
+            files += 1
+    return {"cutoff": cutoff, "messages_archived": archived, "archives_created": files}
+
+
+def read_user_rows(path: str, user_id: int) -> List[dict]:
+    table = pq.read_table(path, columns=ARCHIVE_COLUMNS, filters=[("user_id", "=", user_id)])
+    return table.to_pylist()
+
+
+async def read_archived_messages(
+    db: AsyncSession,
+    user_id: int,
+    before: Optional[tuple[datetime, int]],
+    limit: int,
+) -> List[dict]:
+    """
+    Returns up to `limit` of the user's archived messages older than the
+    (created_at, id) key `before`, newest first. Only archive files the
+    user has messages in are opened, newest file first.
+    """
+    stmt = (
+        select(ArchivedMessageRange.newest_created_at, MessageArchive.filename)
+        .join(MessageArchive, MessageArchive.id == ArchivedMessageRange.archive_id)
+        .where(ArchivedMessageRange.user_id == user_id)
+        .order_by(ArchivedMessageRange.newest_created_at.desc())
+    )
+    if before is not None:
+        stmt = stmt.where(ArchivedMessageRange.oldest_created_at <= before[0])
+    ranges = (await db.execute(stmt)).all()
+
+    collected: List[dict] = []
+    for newest_created_at, filename in ranges:
+        # Files are visited newest first; once a full page is older than
+        # everything left to read, the remaining files can't contribute
+        if len(collected) >= limit and collected[limit - 1]["created_at"] > newest_created_at:
+            break
+        rows = await asyncio.to_thread(read_user_rows, resolve_archive(filename), user_id)
+        collected.extend(
+            row for row in rows
+            if before is None or (row["created_at"], row["id"]) < before
+        )
+        collected.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+    return collected[:limit]
+
+
+async def export_messages(include_live: bool = False) -> AsyncIterator[str]:
+    """
+    Yields every archived message as a JSON line, one Parquet batch at a
+    time, optionally followed by the messages still in the database.
+    """
+    async with SessionLocal() as db:
+        filenames = (await db.scalars(select(MessageArchive.filename).order_by(MessageArchive.id))).all()
+
+    for filename in filenames:
+        parquet_file = pq.ParquetFile(resolve_archive(filename))
+        async for batch in iterate_in_thread(parquet_file.iter_batches(batch_size=EXPORT_BATCH_SIZE)):
+            yield "".join(
+                json.dumps({**row, "archived": True}, default=str) + "\n" for row in batch.to_pylist()
+            )
+
+    if include_live:
+        async with SessionLocal() as db:
+            result = await db.stream(
+                select(*(getattr(Message, column) for column in ARCHIVE_COLUMNS))
+                .order_by(Message.id)
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            async for rows in result.partitions():
+                yield "".join(
+                    json.dumps({**row._asdict(), "archived": False}, default=str) + "\n" for row in rows
+                )
+
+
+async def run_archiver():
+    while True:
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
+        try:
+            result = await archive_old_messages()
+            if result["messages_archived"]:
+                logger.info(f"Periodic archiving moved {result['messages_archived']} messages")
+        except Exception as e:
+            logger.error(f"Periodic archiving failed: {e}")
+
+
+def start_archiver():
+    global _archiver_task
+    if settings.ARCHIVE_INTERVAL_SECONDS > 0 and _archiver_task is None:
+        _archiver_task = asyncio.create_task(run_archiver())
+
+
+async def stop_archiver():
+    global _archiver_task
+    if _archiver_task is not None:
+        _archiver_task.cancel()
+        await asyncio.gather(_archiver_task, return_exceptions=True)
+        _archiver_task = None
@@ -1,63 +1,428 @@
 
-from typing import List
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional
 import httpx
 
 from src.config import settings
+from src.context import assemble_context, truncate_to_tokens
+from src.metrics import (
+    LLM_COALESCED, LLM_ERRORS, LLM_HEDGES, LLM_MODEL_SECONDS, LLM_PROMPT_TOKENS, LLM_REQUEST_SECONDS,
+    record_stage, stage,
+)
+from src.prompt_builder import prompt_builder
+from src.rate_limit import llm_admission
+from src.response_cache import response_cache
+from src.retrieval import question_key
+from src.single_flight import SingleFlight
 import logging
 
 logger = logging.getLogger(__name__)
 
 OPENROUTER_API_KEY = settings.OPENROUTER_API_KEY
 
+UNKNOWN_ANSWER_MARKER = "I don't know the answer to that question yet"
+
+FALLBACK_RESPONSE = "I'm sorry, I'm experiencing technical difficulties. Please try again later."
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class IncompleteStreamError(Exception):
+    """The upstream stream broke off after some of the reply had been yielded."""
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a student and the MIT University of Lagos program assistant.
+Merge the previous summary (if any) with the new messages into one updated summary of at most 150 words.
+Keep what the student told us about themselves, the questions they asked, the answers they got, and anything still unresolved.
+Write plain prose in the third person and do not add information that is not in the conversation."""
+
+# Longest single message passed to the summarizer
+SUMMARY_MESSAGE_TOKENS = 300
+
+# Samples a model needs before its own p95 replaces the default hedge delay
+MIN_LATENCY_SAMPLES = 20
+
+
+class ModelStats:
+    """Rolling latency and outcome samples for one model."""
+
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+
+    def record(self, seconds: Optional[float], ok: bool):
+        self.outcomes.append(ok)
+        if ok and seconds is not None:
+            self.latencies.append(seconds)
+
+    def record_cancelled(self, seconds: float):
+        # The call would have taken at least this long; without the sample a
+        # model that always loses hedge races would never look slow
+        self.latencies.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def as_dict(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "requests": len(self.outcomes),
+            "error_rate": round(self.error_rate(), 3),
+            "p50_seconds": round(p50, 3) if p50 is not None else None,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class ModelRouter:
+    """
+    Orders the configured models for each request and decides how long to
+    wait on one before hedging to the next. Healthy models are tried fastest
+    first by observed median latency, ahead of those without enough samples
+    yet, which keep their configured order. Models whose recent error rate is
+    above LLM_ROUTER_MAX_ERROR_RATE are tried after the healthy ones.
+    """
+
+    def __init__(self, models: List[str]):
+        self.models = list(models)
+        self.stats = {model: ModelStats(settings.LLM_ROUTER_WINDOW) for model in self.models}
+
+    def order(self) -> List[str]:
+        def key(model: str):
+            stats = self.stats[model]
+            p50 = stats.percentile(0.5)
+            return (
+                stats.error_rate() > settings.LLM_ROUTER_MAX_ERROR_RATE,
+                p50 if p50 is not None else float("inf"),
+            )
+
+        return sorted(self.models, key=key)
+
+    def hedge_delay(self, model: str) -> float:
+        delay = self.stats[model].percentile(settings.LLM_HEDGE_PERCENTILE)
+        if delay is None:
+            return settings.LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        return min(max(delay, settings.LLM_HEDGE_MIN_DELAY_SECONDS), settings.LLM_HEDGE_MAX_DELAY_SECONDS)
+
+    def record(self, model: str, seconds: Optional[float], ok: bool):
+        """Adds a call's outcome, and its latency when given, to the model's stats."""
+        self.stats[model].record(seconds, ok)
+        if seconds is not None:
+            LLM_MODEL_SECONDS.observe(seconds, model=model, outcome="ok" if ok else "error")
+
+    def record_cancelled(self, model: str, seconds: float):
+        """Adds a lower bound on latency for a call cancelled before it answered."""
+        self.stats[model].record_cancelled(seconds)
+        LLM_MODEL_SECONDS.observe(seconds, model=model, outcome="cancelled")
+
+    def status(self) -> dict:
+        return {model: self.stats[model].as_dict() for model in self.order()}
+
+
 class OpenRouterService:
     def __init__(self):
         self.api_key = OPENROUTER_API_KEY
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
-    
-    async def generate_response(self, messages: List[dict], qa_entries: List[dict]) -> str:
-        system_message = {
-            "role": "system",
-            "content": f"""You are a helpful university chatbot assistant. You can answer questions based on the following Q&A database:
-
-{chr(10).join([f"Q: {qa['question']}{chr(10)}A: {qa['answer']}{chr(10)}" for qa in qa_entries])}
-
-Rules:
-1. Only answer questions based on the provided Q&A database. Don't say you ae using a database source. Make it natural and if you are asked something else that is not relating to enquiries on the MIT University of lagos program, say you are desinged only to provide answers for this program. 
-2. Be friendly and helpful in your responses. You can add a bit of humor to make the conversation more engaging.
-3. If you cannot find the answer in the database, respond with exactly: "I don't know the answer to that question yet, but don't worry! Please reach back out in the next 24-48 hours as I will inform our admin team to provide you with an accurate answer."
-4. Do not provide information outside of the Q&A database
-5. Keep responses concise but informative and engaging. Format your responses in a way that is easy to read and understand. Add paragraphs where appropriate.
-"""
+        self.base_url = settings.OPENROUTER_BASE_URL
+        self.client: Optional[httpx.AsyncClient] = None
+        self.semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        self.single_flight = SingleFlight()
+        self.router = ModelRouter(settings.LLM_MODELS)
+
+    async def start(self):
+        if self.client is not None:
+            return
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            timeout=httpx.Timeout(
+                settings.OPENROUTER_READ_TIMEOUT,
+                connect=settings.OPENROUTER_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.OPENROUTER_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENROUTER_KEEPALIVE_EXPIRY,
+            ),
+        )
+        logger.info(f"OpenRouter client started (http2={HTTP2_AVAILABLE})")
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            logger.info("OpenRouter client closed")
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), settings.OPENROUTER_RETRY_MAX_BACKOFF)
+        # Full jitter so a burst of failures doesn't retry in lockstep
+        ceiling = settings.OPENROUTER_RETRY_BACKOFF * (2 ** attempt)
+        return random.uniform(0, min(ceiling, settings.OPENROUTER_RETRY_MAX_BACKOFF))
+
+    async def _post(self, payload: dict) -> dict:
+        if self.client is None:
+            await self.start()
+
+        for attempt in range(settings.OPENROUTER_MAX_RETRIES + 1):
+            response = None
+            try:
+                async with self.semaphore:
+                    response = await self.client.post(self.base_url, json=payload)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                error = repr(e)
+
+            if attempt == settings.OPENROUTER_MAX_RETRIES:
+                if response is not None:
+                    response.raise_for_status()
+                raise httpx.HTTPError(f"OpenRouter request failed: {error}")
+
+            delay = self._backoff(attempt, response)
+            logger.warning(
+                f"OpenRouter attempt {attempt + 1} failed ({error}), retrying in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+
+    def build_payload(
+        self,
+        messages: List[dict],
+        qa_entries: List[dict],
+        stream: bool = False,
+        summary: Optional[str] = None,
+    ) -> dict:
+        messages, qa_entries, prompt_tokens = assemble_context(messages, qa_entries, summary)
+        LLM_PROMPT_TOKENS.observe(prompt_tokens)
+        # The model is filled in per attempt by the router
+        payload = {
+            "messages": prompt_builder.build_messages(messages, qa_entries),
+            "max_tokens": settings.LLM_MAX_TOKENS,
+            "temperature": 0.7
         }
-        
-        all_messages = [system_message] + messages
-        
-        async with httpx.AsyncClient() as client:
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    async def generate_response(
+        self, messages: List[dict], qa_entries: List[dict], summary: Optional[str] = None
+    ) -> str:
+        with stage("prompt_build"):
+            payload = self.build_payload(messages, qa_entries, summary=summary)
+        started = time.perf_counter()
+        try:
+            with stage("llm_call"):
+                content, model = await self._complete_routed(payload)
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, mode="complete", outcome="ok")
+            logger.info(f"Bot response generated successfully by {model}")
+            return content
+
+        except Exception as e:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, mode="complete", outcome="error")
+            LLM_ERRORS.inc(mode="complete", error=type(e).__name__)
+            logger.error(f"error generating bot response: {e}")
+            return FALLBACK_RESPONSE
+
+    async def _complete(self, payload: dict, model: str) -> str:
+        started = time.perf_counter()
+        try:
+            result = await self._post({**payload, "model": model})
+            content = result["choices"][0]["message"]["content"]
+        except asyncio.CancelledError:
+            # Lost a hedge race; that says nothing about the model's health,
+            # but it does say how slow it was
+            self.router.record_cancelled(model, time.perf_counter() - started)
+            raise
+        except Exception:
+            self.router.record(model, time.perf_counter() - started, ok=False)
+            raise
+        self.router.record(model, time.perf_counter() - started, ok=True)
+        logger.debug(f"OpenRouter response from {model}: {result}")
+        return content
+
+    async def _complete_routed(self, payload: dict) -> tuple[str, str]:
+        """
+        Sends the payload to the preferred model. If it hasn't answered within
+        its hedge delay, the next model is asked as well and whichever answers
+        first wins; the other call is cancelled. A model that fails hands over
+        to the next one in line. Returns the content and the answering model.
+        """
+        candidates = self.router.order()
+        pending: dict[asyncio.Task, str] = {}
+        launched = 0
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch():
+            nonlocal launched
+            model = candidates[launched]
+            pending[asyncio.create_task(self._complete(payload, model))] = model
+            launched += 1
+
+        launch()
+        try:
+            while pending:
+                can_hedge = not hedged and launched < len(candidates)
+                timeout = self.router.hedge_delay(candidates[0]) if can_hedge else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    logger.info(f"{candidates[0]} is slow, hedging to {candidates[launched]}")
+                    launch()
+                    continue
+
+                for task in done:
+                    model = pending.pop(task)
+                    if task.exception() is None:
+                        if hedged:
+                            LLM_HEDGES.inc(winner=model)
+                        return task.result(), model
+                    last_error = task.exception()
+                    logger.warning(f"{model} failed: {last_error!r}")
+                if not pending and launched < len(candidates):
+                    launch()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def generate_admitted_response(
+        self, messages: List[dict], qa_entries: List[dict], summary: Optional[str] = None
+    ) -> str:
+        """generate_response behind an LLM admission slot."""
+        async with llm_admission.slot():
+            # Whoever held the slot we waited for may have just answered this
+            cached = response_cache.get(messages[-1]["content"])
+            if cached is not None:
+                logger.info("Bot response found in the cache after admission")
+                return cached
+            return await self.generate_response(messages, qa_entries, summary)
+
+    async def generate_shared_response(
+        self, messages: List[dict], qa_entries: List[dict], summary: Optional[str] = None
+    ) -> str:
+        """
+        generate_admitted_response for the opening message of a conversation.
+        Concurrent requests asking the same normalized question against the
+        same knowledge-base version share one upstream call, and only the
+        request making it takes an admission slot; anything with history goes
+        upstream on its own.
+        """
+        if len(messages) != 1 or summary:
+            return await self.generate_admitted_response(messages, qa_entries, summary)
+
+        question = messages[0]["content"]
+        key = (question_key(question) or question.strip().lower(), prompt_builder.version)
+        started = time.perf_counter()
+        response, shared = await self.single_flight.do(
+            key, lambda: self.generate_admitted_response(messages, qa_entries)
+        )
+        if shared:
+            LLM_COALESCED.inc()
+            record_stage("llm_coalesced", time.perf_counter() - started)
+            logger.info("Bot response shared from an in-flight request")
+        return response
+
+    async def summarize(self, previous_summary: Optional[str], messages: List[dict]) -> Optional[str]:
+        """Folds messages into the previous summary. Returns None if the call fails."""
+        transcript = "\n".join(
+            f"{'Assistant' if message['role'] == 'assistant' else 'Student'}: "
+            f"{truncate_to_tokens(message['content'], SUMMARY_MESSAGE_TOKENS)}"
+            for message in messages
+        )
+        payload = {
+            "messages": [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {
+                    "role": "user",
+                    "content": f"Previous summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}",
+                },
+            ],
+            "max_tokens": settings.SUMMARY_MAX_TOKENS,
+            "temperature": 0.2,
+        }
+        try:
+            content, _ = await self._complete_routed(payload)
+            return content.strip()
+        except Exception as e:
+            logger.error(f"error summarizing conversation: {e}")
+            return None
+
+    async def stream_response(
+        self, messages: List[dict], qa_entries: List[dict], summary: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yields the completion token by token. Failures before the first token
+        yield FALLBACK_RESPONSE instead; a failure mid-stream raises
+        IncompleteStreamError once the tokens already produced are yielded.
+        """
+        if self.client is None:
+            await self.start()
+
+        with stage("prompt_build"):
+            payload = self.build_payload(messages, qa_entries, stream=True, summary=summary)
+        started = time.perf_counter()
+        produced = False
+        error: Optional[Exception] = None
+        # No hedging here, but a model that fails before its first token hands
+        # over to the next one
+        for model in self.router.order():
             try:
-                response = await client.post(
-                    f"{self.base_url}",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        # "model": "anthropic/claude-3-sonnet",
-                        "model": "deepseek/deepseek-r1-0528:free",
-                        "messages": all_messages,
-                        "max_tokens": 500,
-                        "temperature": 0.7
-                    }
-                )
-                response.raise_for_status()
-                result = response.json()
-                logger.info(result)
-                logger.info("Bot response generated successfully")
-                logger.info(result["choices"][0]["message"]["content"])
-                return result["choices"][0]["message"]["content"]
-            
+                async with self.semaphore:
+                    async with self.client.stream("POST", self.base_url, json={**payload, "model": model}) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            # OpenRouter interleaves ": OPENROUTER PROCESSING" keep-alive comments
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            delta = json.loads(data)["choices"][0].get("delta", {})
+                            if delta.get("content"):
+                                produced = True
+                                yield delta["content"]
+                # Stream durations aren't comparable with completions, so only the outcome counts
+                self.router.record(model, None, ok=True)
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, mode="stream", outcome="ok")
+                logger.info(f"Bot response streamed successfully by {model}")
+                return
+
             except Exception as e:
-                print(f"OpenRouter API error: {e}")
-                logger.error(f"error generating bot response: {e}")
-                return "I'm sorry, I'm experiencing technical difficulties. Please try again later."
+                self.router.record(model, None, ok=False)
+                error = e
+                logger.warning(f"{model} failed to stream: {e!r}")
+                if produced:
+                    break
+
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, mode="stream", outcome="error")
+        LLM_ERRORS.inc(mode="stream", error=type(error).__name__)
+        logger.error(f"error streaming bot response: {error}")
+        if produced:
+            raise IncompleteStreamError(repr(error))
+        yield FALLBACK_RESPONSE
 
-openrouter_service = OpenRouterService()
\ No newline at end of file
+openrouter_service = OpenRouterService()
@@ -0,0 +1,173 @@
+import threading
+import time
+import zlib
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from src.analytics import record_answers
+from src.config import settings
+from src.entities import QAEntry, UnansweredCluster, UnansweredQuestion
+from src.knowledge_base import bump_version, refresh_knowledge_base
+from src.retrieval import MEANING_WORDS, question_tokens
+import logging
+
+logger = logging.getLogger(__name__)
+
+VECTOR_SIZE = 2 ** 12
+
+
+def vectorize(text: str) -> Optional[np.ndarray]:
+    """
+    Hashed bag of words and bigrams, log-scaled and L2-normalized so a dot
+    product between two vectors is their cosine similarity.
+    """
+    tokens = question_tokens(text)
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not features:
+        return None
+
+    vector = np.zeros(VECTOR_SIZE, dtype=np.float32)
+    for feature in features:
+        vector[zlib.crc32(feature.encode("utf-8")) % VECTOR_SIZE] += 1
+    np.log1p(vector, out=vector)
+    return vector / np.linalg.norm(vector)
+
+
+class ClusterIndex:
+    """In-memory vectors of the open unanswered-question clusters."""
+
+    def __init__(self, threshold: float = settings.UNANSWERED_CLUSTER_SIMILARITY):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._ids: list[int] = []
+        self._vectors: list[np.ndarray] = []
+        self._meanings: list[frozenset] = []
+        self._matrix: Optional[np.ndarray] = None
+        self.loaded = False
+        self.loaded_at = 0.0
+
+    def load(self, clusters):
+        with self._lock:
+            self._ids, self._vectors, self._meanings, self._matrix = [], [], [], None
+            for cluster_id, question in clusters:
+                self._add(cluster_id, question)
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+        logger.info(f"Cluster index built with {len(self._ids)} open clusters")
+
+    def add(self, cluster_id: int, question: str):
+        with self._lock:
+            self._add(cluster_id, question)
+
+    def _add(self, cluster_id: int, question: str):
+        vector = vectorize(question)
+        if vector is None:
+            return
+        self._ids.append(cluster_id)
+        self._vectors.append(vector)
+        self._meanings.append(frozenset(question_tokens(question)) & MEANING_WORDS)
+        self._matrix = None
+
+    def remove(self, cluster_id: int):
+        with self._lock:
+            if cluster_id in self._ids:
+                index = self._ids.index(cluster_id)
+                del self._ids[index]
+                del self._vectors[index]
+                del self._meanings[index]
+                self._matrix = None
+
+    def match(self, question: str) -> Optional[int]:
+        """Returns the id of the most similar open cluster above the threshold."""
+        vector = vectorize(question)
+        meaning = frozenset(question_tokens(question)) & MEANING_WORDS
+        with self._lock:
+            if vector is None or not self._ids:
+                return None
+            if self._matrix is None:
+                self._matrix = np.vstack(self._vectors)
+            scores = self._matrix @ vector
+            # However similar the rest, "when" and "where" ask different things
+            for index, cluster_meaning in enumerate(self._meanings):
+                if cluster_meaning != meaning:
+                    scores[index] = 0.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return self._ids[best]
+
+
+cluster_index = ClusterIndex()
+
+
+async def load_cluster_index(db: AsyncSession):
+    rows = await db.execute(
+        select(UnansweredCluster.id, UnansweredCluster.question)
+        .where(UnansweredCluster.is_answered == False)
+    )
+    cluster_index.load(rows.all())
+
+
+async def sync_cluster_index(db: AsyncSession):
+    """
+    Loads the open clusters on first use and reloads them every
+    UNANSWERED_CLUSTER_SYNC_INTERVAL_SECONDS, so clusters opened or answered
+    on other workers are picked up.
+    """
+    age = time.monotonic() - cluster_index.loaded_at
+    if not cluster_index.loaded or age >= settings.UNANSWERED_CLUSTER_SYNC_INTERVAL_SECONDS:
+        await load_cluster_index(db)
+
+
+async def assign_cluster(db: AsyncSession, question: str) -> tuple[int, bool]:
+    """
+    Finds or creates the open cluster for a new unanswered question. Returns
+    the cluster id and whether it was just created; new clusters must be
+    added to cluster_index once the transaction commits.
+    """
+    await sync_cluster_index(db)
+
+    cluster_id = cluster_index.match(question)
+    if cluster_id is not None:
+        result = await db.execute(
+            update(UnansweredCluster)
+            .where(UnansweredCluster.id == cluster_id, UnansweredCluster.is_answered == False)
+            .values(question_count=UnansweredCluster.question_count + 1, updated_at=func.now())
+        )
+        if result.rowcount:
+            return cluster_id, False
+        # Answered by another worker since this index was loaded
+        cluster_index.remove(cluster_id)
+
+    cluster = UnansweredCluster(question=question, question_count=1)
+    db.add(cluster)
+    await db.flush()
+    return cluster.id, True
+
+
+async def resolve_cluster(db: AsyncSession, cluster: UnansweredCluster, answer: str) -> UnansweredCluster:
+    """Answers every question in the cluster with a single new QAEntry."""
+    answered = await db.execute(
+        update(UnansweredQuestion)
+        .where(UnansweredQuestion.cluster_id == cluster.id, UnansweredQuestion.is_answered == False)
+        .values(is_answered=True, answer=answer, answered_at=func.now())
+        .returning(UnansweredQuestion.created_at, UnansweredQuestion.answered_at)
+    )
+    await record_answers(db, answered.all())
+    cluster.is_answered = True
+    cluster.answer = answer
+    cluster.answered_at = func.now()
+
+    qa_entry = QAEntry(question=cluster.question, answer=answer)
+    db.add(qa_entry)
+    version = await bump_version(db)
+    await db.commit()
+    await db.refresh(cluster)
+
+    cluster_index.remove(cluster.id)
+    refresh_knowledge_base([{"id": qa_entry.id, "question": qa_entry.question, "answer": qa_entry.answer}], version)
+    return cluster
@@ -21,20 +21,159 @@ class Settings(BaseSettings):
     # Environment and Logging
     ENVIRONMENT: Environment = Environment.PRODUCTION
     LOG_LEVEL: str = "INFO"
+    # Requests slower than this are logged with their per-stage timings; 0 disables
+    SLOW_REQUEST_THRESHOLD_MS: float = 3000.0
     JWT_SECRET: str = JWT_SECRET
+    # bcrypt calls allowed to run at once in worker threads
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 4
+    TOKEN_CACHE_SIZE: int = 1024
+    TOKEN_CACHE_TTL_SECONDS: float = 300.0
 
     # External Services
     OPENROUTER_API_KEY: str = OPENROUTER_API_KEY
+    OPENROUTER_BASE_URL: str = "https://openrouter.ai/api/v1/chat/completions"
+
+    # OpenRouter HTTP client
+    OPENROUTER_CONNECT_TIMEOUT: float = 5.0
+    OPENROUTER_READ_TIMEOUT: float = 60.0
+    OPENROUTER_MAX_CONNECTIONS: int = 50
+    OPENROUTER_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENROUTER_KEEPALIVE_EXPIRY: float = 30.0
+    OPENROUTER_MAX_RETRIES: int = 2
+    OPENROUTER_RETRY_BACKOFF: float = 0.5
+    OPENROUTER_RETRY_MAX_BACKOFF: float = 8.0
+    # Upper bound on in-flight LLM calls per worker; extra requests queue
+    LLM_MAX_CONCURRENCY: int = 16
+    # Chat requests needing the LLM beyond LLM_MAX_CONCURRENCY wait in a queue
+    # of this size; when it is full, or the wait runs out, they get a 503
+    LLM_ADMISSION_QUEUE_SIZE: int = 32
+    LLM_ADMISSION_TIMEOUT_SECONDS: float = 10.0
+
+    # Model routing: tried in this order, healthy models first
+    LLM_MODELS: List[str] = ["deepseek/deepseek-r1-0528:free"]
+    # A second model is asked once the first has been slower than its own p95,
+    # clamped to this range; the default applies until there are enough samples
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 1.0
+    LLM_HEDGE_MAX_DELAY_SECONDS: float = 20.0
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS: float = 8.0
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    LLM_ROUTER_WINDOW: int = 200
+    # Models whose recent error rate exceeds this are tried last
+    LLM_ROUTER_MAX_ERROR_RATE: float = 0.5
 
     # Database
     DATABASE_URL: str = DATABASE_URL
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Connections opened at startup so the first requests don't pay for them
+    DB_WARMUP_CONNECTIONS: int = 5
+    # Backoff between warm-up attempts while e.g. the database is unreachable at boot
+    WARMUP_RETRY_BACKOFF_SECONDS: float = 1.0
+    WARMUP_RETRY_MAX_BACKOFF_SECONDS: float = 30.0
 
     #Smtp
     SMTP_SERVER: str = SMTP_SERVER
     SMTP_PASSWORD: str = SMTP_PASSWORD
     ADMIN_EMAIL: str = ADMIN_EMAIL
     SMTP_USERNAME: str = SMTP_USERNAME
-    SMTP_PORT: str = SMTP_PORT
+    SMTP_PORT: int = SMTP_PORT
+    SMTP_USE_TLS: bool = True
+    SMTP_TIMEOUT: float = 30.0
+    # Unanswered-question emails are batched into a digest at this interval
+    NOTIFICATION_FLUSH_INTERVAL_SECONDS: float = 60.0
+
+    # Knowledge base retrieval
+    RETRIEVAL_TOP_K: int = 8
+    RETRIEVAL_MIN_SCORE: float = 0.0
+    # How often a worker checks whether another worker changed the knowledge base
+    KB_SYNC_INTERVAL_SECONDS: float = 30.0
+    # Direct answers: a question whose normalized words overlap a retrieved QA
+    # entry's question at least this much (Jaccard, 0-1) gets the stored answer
+    # without an LLM call
+    DIRECT_ANSWER_ENABLED: bool = True
+    DIRECT_ANSWER_THRESHOLD: float = 0.8
+    DIRECT_ANSWER_MIN_TOKENS: int = 2
+    # Wraps the stored answer; {answer} and {question} are filled in
+    DIRECT_ANSWER_TEMPLATE: str = "{answer}"
+
+    # Most conversation turns fetched for a prompt, including the new message;
+    # CONTEXT_TOKEN_BUDGET decides how many of them are actually sent
+    CHAT_HISTORY_WINDOW: int = 30
+    # Estimated prompt tokens plus LLM_MAX_TOKENS must fit in this budget
+    CONTEXT_TOKEN_BUDGET: int = 6000
+    LLM_MAX_TOKENS: int = 500
+
+    # Rolling conversation summaries: the newest SUMMARY_KEEP_RECENT_MESSAGES
+    # stay verbatim and everything older is folded into the summary once
+    # SUMMARY_REFRESH_EVERY more messages have piled up on top of them
+    SUMMARY_KEEP_RECENT_MESSAGES: int = 10
+    SUMMARY_REFRESH_EVERY: int = 10
+    # Oldest unsummarized messages beyond this are dropped rather than summarized
+    SUMMARY_MAX_INPUT_MESSAGES: int = 40
+    SUMMARY_MAX_TOKENS: int = 300
+    SUMMARY_MAX_CONCURRENCY: int = 2
+
+    # Cosine similarity above which an unanswered question joins an open cluster
+    UNANSWERED_CLUSTER_SIMILARITY: float = 0.6
+    # How often a worker reloads the open clusters that other workers opened or answered
+    UNANSWERED_CLUSTER_SYNC_INTERVAL_SECONDS: float = 30.0
+
+    # Message retention: older messages move to Parquet files under ARCHIVE_DIR
+    MESSAGE_RETENTION_DAYS: int = 180
+    ARCHIVE_DIR: str = "archives"
+    ARCHIVE_BATCH_SIZE: int = 5000
+    ARCHIVE_COMPRESSION: str = "zstd"
+    # How often each worker looks for messages to archive; 0 leaves it to the admin endpoint
+    ARCHIVE_INTERVAL_SECONDS: float = 6 * 60 * 60
+
+    # Outbox: side effects of chat requests, processed by a background worker
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 2.0
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    OUTBOX_RETRY_BACKOFF_SECONDS: float = 5.0
+    OUTBOX_RETRY_MAX_BACKOFF_SECONDS: float = 600.0
+    # A claimed event that isn't finished by then is picked up again, e.g. after a crash
+    OUTBOX_LEASE_SECONDS: float = 120.0
+    OUTBOX_RETENTION_HOURS: float = 72.0
+
+    # Rate limits: token buckets refilled at the per-minute rate, allowing
+    # bursts of up to *_BURST requests. A rate of 0 turns that limit off
+    RATE_LIMIT_MESSAGE_PER_MINUTE: float = 20.0
+    RATE_LIMIT_MESSAGE_BURST: int = 5
+    RATE_LIMIT_MESSAGE_IP_PER_MINUTE: float = 120.0
+    RATE_LIMIT_MESSAGE_IP_BURST: int = 30
+    # Student sign-up and admin login, per IP
+    RATE_LIMIT_AUTH_IP_PER_MINUTE: float = 30.0
+    RATE_LIMIT_AUTH_IP_BURST: int = 10
+    # Buckets kept per limit; the least recently seen keys are dropped first
+    RATE_LIMIT_MAX_KEYS: int = 10000
+
+    # Admin analytics: days shown by default and at most, and how many open
+    # unanswered clusters are listed as top topics
+    ANALYTICS_DEFAULT_DAYS: int = 30
+    ANALYTICS_MAX_DAYS: int = 366
+    ANALYTICS_TOP_UNANSWERED: int = 10
+
+    # Cursor pagination for listing endpoints
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+
+    # Bulk knowledge base ingestion
+    INGESTION_BATCH_SIZE: int = 500
+    INGESTION_PDF_WORKERS: int = 2
+    INGESTION_PDF_PAGES_PER_TASK: int = 20
+    # Finished jobs are kept this long so admins can check the outcome
+    INGESTION_JOB_RETENTION_HOURS: int = 24
+
+    # Response cache
+    RESPONSE_CACHE_SIZE: int = 2048
+    RESPONSE_CACHE_TTL_SECONDS: float = 6 * 60 * 60
+    # Jaccard similarity needed for a near-duplicate hit; 1.0 disables it
+    RESPONSE_CACHE_SIMILARITY: float = 0.85
+    RESPONSE_CACHE_MIN_TOKENS: int = 3
 
     # CORS
     CORS_ORIGINS: List[str] = ["*"]
@@ -0,0 +1,117 @@
+import math
+import re
+from typing import List, Optional
+
+from src.config import settings
+from src.prompt_builder import SYSTEM_PROMPT_HEADER, SYSTEM_PROMPT_RULES, render_entry
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+# Role markers and separators the chat template adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# A partially kept turn shorter than this is more noise than context
+MIN_TRUNCATED_TOKENS = 32
+
+SUMMARY_HEADER = "Summary of the earlier conversation with this student:\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Offline token estimate: word/punctuation pieces, or ~4 characters per
+    token for text with long words, whichever is larger.
+    """
+    if not text:
+        return 0
+    return max(len(TOKEN_PIECES.findall(text)), math.ceil(len(text) / 4))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keeps the end of the text, which is the part a later turn follows on from."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    pieces = list(TOKEN_PIECES.finditer(text))
+    keep = min(max_tokens, len(pieces))
+    while keep > 0:
+        truncated = text[pieces[-keep].start():]
+        # One extra token for the ellipsis marking the cut
+        if estimate_tokens(truncated) + 1 <= max_tokens:
+            return "…" + truncated
+        keep = int(keep * 0.8)
+    return ""
+
+
+BASE_PROMPT_TOKENS = (
+    estimate_tokens(SYSTEM_PROMPT_HEADER) + estimate_tokens(SYSTEM_PROMPT_RULES) + MESSAGE_OVERHEAD_TOKENS
+)
+
+
+def assemble_context(
+    messages: List[dict], qa_entries: List[dict], summary: Optional[str] = None
+) -> tuple[List[dict], List[dict], int]:
+    """
+    Fits the prompt into CONTEXT_TOKEN_BUDGET minus the reply allowance.
+
+    The system prompt and the newest message always go in, followed by the
+    conversation summary if there is one. Retrieved QA entries are added in
+    rank order next, and the remaining budget is filled with history from the
+    newest turn backwards; the oldest turn that only partly fits is truncated
+    and anything older is dropped.
+
+    Returns the messages and QA entries to send and the prompt token estimate.
+    The summary, when kept, is the first message.
+    """
+    budget = settings.CONTEXT_TOKEN_BUDGET - settings.LLM_MAX_TOKENS
+    used = BASE_PROMPT_TOKENS
+
+    *older, latest = messages or [{"role": "user", "content": ""}]
+    latest_tokens = estimate_tokens(latest["content"]) + MESSAGE_OVERHEAD_TOKENS
+    if used + latest_tokens > budget:
+        latest = {**latest, "content": truncate_to_tokens(latest["content"], max(budget - used, 0))}
+        latest_tokens = estimate_tokens(latest["content"]) + MESSAGE_OVERHEAD_TOKENS
+    used += latest_tokens
+
+    summary_message = None
+    if summary:
+        content = truncate_to_tokens(
+            SUMMARY_HEADER + summary, max(budget - used - MESSAGE_OVERHEAD_TOKENS, 0)
+        )
+        if content:
+            summary_message = {"role": "system", "content": content}
+            used += estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+    selected_qa = []
+    for entry in qa_entries:
+        cost = estimate_tokens(render_entry(entry))
+        if used + cost > budget:
+            break
+        selected_qa.append(entry)
+        used += cost
+
+    history = []
+    for message in reversed(older):
+        cost = estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+        if used + cost <= budget:
+            history.append(message)
+            used += cost
+            continue
+        remaining = budget - used - MESSAGE_OVERHEAD_TOKENS
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            message = {**message, "content": truncate_to_tokens(message["content"], remaining)}
+            history.append(message)
+            used += estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+        break
+
+    logger.info(
+        f"Prompt token estimate: {used} of {budget} "
+        f"({len(selected_qa)}/{len(qa_entries)} QA entries, {len(history)}/{len(older)} history turns, "
+        f"summary {'included' if summary_message is not None else 'none'})"
+    )
+    history.reverse()
+    history.append(latest)
+    if summary_message is not None:
+        history.insert(0, summary_message)
+    return history, selected_qa, used
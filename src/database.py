@@ -1,24 +1,87 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.sql import func
+from sqlalchemy import inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.schema import CreateColumn
 from src.config import settings
+from src.metrics import instrument_engine
 import logging
 
 
 DATABASE_URL = settings.DATABASE_URL
 
+# Async drivers used in place of the sync defaults in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
 logger = logging.getLogger(__name__)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def async_database_url(url: str):
+    db_url = make_url(url)
+    return db_url.set(drivername=ASYNC_DRIVERS.get(db_url.drivername, db_url.drivername))
+
+
+def engine_options(url) -> dict:
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    # SQLite uses a single-file/static pool that doesn't take sizing arguments
+    if url.get_backend_name() != "sqlite":
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    return options
+
+
+ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+
+engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+instrument_engine(engine.sync_engine)
+SessionLocal = async_sessionmaker(
+    bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    logger.info("DB session created")
-    try:
+def upgrade_schema(conn):
+    """
+    create_all only creates missing tables. This adds the nullable columns
+    and the indexes that were later added to tables an existing database
+    already has; it is a no-op once they are there.
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                logger.error(f"{table.name}.{column.name} is missing and must be added by hand")
+                continue
+            # Added without its foreign key; SQLite can't add constraints to an existing table
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            logger.info(f"Adding column {table.name}.{column.name}")
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                logger.info(f"Creating index {index.name}")
+                index.create(conn)
+
+
+async def init_models():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
+
+async def get_db():
+    async with SessionLocal() as db:
+        logger.info("DB session created")
         yield db
         logger.info("DB session closed")
-    finally:
-        db.close()
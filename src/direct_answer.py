@@ -0,0 +1,66 @@
+from typing import List, Optional
+
+from src.config import settings
+from src.metrics import DIRECT_ANSWERS
+from src.retrieval import MEANING_WORDS, question_tokens
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A rival entry with a different answer scoring within this of the best one
+# makes the match ambiguous, and the LLM gets to weigh both
+AMBIGUITY_MARGIN = 0.05
+
+
+def match_confidence(tokens: set, entry_question: str) -> float:
+    """
+    Jaccard similarity of the normalized question words, from 0 to 1.
+    Questions using different interrogatives or negations ("when" and
+    "where") score 0 however much else they share.
+    """
+    entry_tokens = set(question_tokens(entry_question))
+    if not tokens or not entry_tokens:
+        return 0.0
+    if tokens & MEANING_WORDS != entry_tokens & MEANING_WORDS:
+        return 0.0
+    return len(tokens & entry_tokens) / len(tokens | entry_tokens)
+
+
+def render_answer(entry: dict) -> str:
+    try:
+        return settings.DIRECT_ANSWER_TEMPLATE.format(answer=entry["answer"], question=entry["question"])
+    except (KeyError, IndexError, ValueError) as e:
+        logger.warning(f"DIRECT_ANSWER_TEMPLATE could not be applied: {e!r}")
+        return entry["answer"]
+
+
+def direct_answer(question: str, candidates: List[dict]) -> Optional[str]:
+    """
+    Returns the stored answer when the question is a near-verbatim match of
+    one of the retrieved QA entries, or None to leave it to the LLM.
+    """
+    if not settings.DIRECT_ANSWER_ENABLED:
+        return None
+    tokens = set(question_tokens(question))
+    if len(tokens - MEANING_WORDS) < settings.DIRECT_ANSWER_MIN_TOKENS:
+        return None
+
+    scored = sorted(
+        ((match_confidence(tokens, entry["question"]), entry) for entry in candidates if entry["answer"].strip()),
+        key=lambda pair: pair[0],
+        reverse=True,
+    )
+    if not scored or scored[0][0] < settings.DIRECT_ANSWER_THRESHOLD:
+        return None
+
+    confidence, best = scored[0]
+    for other_confidence, other in scored[1:]:
+        if other_confidence < confidence - AMBIGUITY_MARGIN:
+            break
+        if other["answer"].strip() != best["answer"].strip():
+            logger.info(f"Direct answer skipped: QA entries {best['id']} and {other['id']} match equally well")
+            return None
+
+    DIRECT_ANSWERS.inc()
+    logger.info(f"Answered directly from QA entry {best['id']} (confidence {confidence:.2f})")
+    return render_answer(best)
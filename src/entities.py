@@ -1,7 +1,7 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Float, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from src.database import Base, engine
+from src.database import Base
 
 class User(Base):
     __tablename__ = "users"
@@ -33,6 +33,55 @@ class Message(Base):
     
     user = relationship("User", back_populates="messages")
 
+    __table_args__ = (
+        Index("ix_messages_user_id_created_at", "user_id", "created_at"),
+    )
+
+class MessageArchive(Base):
+    """A Parquet file holding messages moved out of the messages table."""
+    __tablename__ = "message_archives"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String, unique=True, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    min_message_id = Column(Integer, nullable=False)
+    max_message_id = Column(Integer, nullable=False)
+    oldest_created_at = Column(DateTime, nullable=False)
+    newest_created_at = Column(DateTime, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("ix_message_archives_created_at_id", "created_at", "id"),
+    )
+
+class ArchivedMessageRange(Base):
+    """Which archive files hold a user's messages, so history reads open only those."""
+    __tablename__ = "archived_message_ranges"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    archive_id = Column(Integer, ForeignKey("message_archives.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    message_count = Column(Integer, nullable=False)
+    oldest_created_at = Column(DateTime, nullable=False)
+    newest_created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_archived_message_ranges_user_id_newest", "user_id", "newest_created_at"),
+    )
+
+class ConversationSummary(Base):
+    """Rolling summary of a user's messages up to and including last_message_id."""
+    __tablename__ = "conversation_summaries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
+    summary = Column(Text, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
 class QAEntry(Base):
     __tablename__ = "qa_entries"
     
@@ -42,16 +91,130 @@ class QAEntry(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_qa_entries_created_at_id", "created_at", "id"),
+    )
+
+class KnowledgeBaseVersion(Base):
+    """Single row bumped in the same transaction as every QAEntry change."""
+    __tablename__ = "knowledge_base_version"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class UnansweredCluster(Base):
+    __tablename__ = "unanswered_clusters"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    question = Column(Text)
+    question_count = Column(Integer, default=1)
+    is_answered = Column(Boolean, default=False)
+    answer = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now())
+    answered_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_unanswered_clusters_is_answered_created_at", "is_answered", "created_at", "id"),
+        Index("ix_unanswered_clusters_is_answered_question_count", "is_answered", "question_count"),
+    )
+
 class UnansweredQuestion(Base):
     __tablename__ = "unanswered_questions"
     
     id = Column(Integer, primary_key=True, index=True)
     question = Column(Text)
     user_id = Column(Integer, ForeignKey("users.id"))
+    cluster_id = Column(Integer, ForeignKey("unanswered_clusters.id"), nullable=True, index=True)
     is_answered = Column(Boolean, default=False)
     answer = Column(Text, nullable=True)
     created_at = Column(DateTime, default=func.now())
     answered_at = Column(DateTime, nullable=True)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    __table_args__ = (
+        Index("ix_unanswered_questions_is_answered_created_at", "is_answered", "created_at", "id"),
+    )
+
+class OutboxEvent(Base):
+    """
+    Side effect of a request, written in the request's transaction and
+    carried out later by the outbox worker.
+    """
+    __tablename__ = "outbox_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event_type = Column(String, nullable=False)
+    idempotency_key = Column(String, unique=True, nullable=False)
+    payload = Column(Text, nullable=False)
+    # pending -> processing -> done, or back to pending for a retry, or failed
+    status = Column(String, default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    # When a pending event is due, or when a processing event's lease runs out
+    available_at = Column(DateTime, default=func.now(), nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_events_status_available_at", "status", "available_at"),
+        Index("ix_outbox_events_created_at_id", "created_at", "id"),
+    )
+
+class DailyStats(Base):
+    """
+    Per-day counters for the analytics dashboard, bumped as chat exchanges
+    are processed and unanswered questions are answered.
+    """
+    __tablename__ = "daily_stats"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, unique=True, nullable=False)
+    questions = Column(Integer, default=0, nullable=False)
+    escalations = Column(Integer, default=0, nullable=False)
+    fallbacks = Column(Integer, default=0, nullable=False)
+    direct_answers = Column(Integer, default=0, nullable=False)
+    cached_answers = Column(Integer, default=0, nullable=False)
+    active_students = Column(Integer, default=0, nullable=False)
+    # Unanswered questions answered by an admin that day, and how long they waited in total
+    questions_answered = Column(Integer, default=0, nullable=False)
+    time_to_answer_seconds = Column(Float, default=0.0, nullable=False)
+
+class TimeToAnswerBucket(Base):
+    """Histogram of answered_at - created_at per answering day, for the median."""
+    __tablename__ = "time_to_answer_buckets"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    # Index into analytics.TIME_TO_ANSWER_BUCKETS
+    bucket = Column(Integer, nullable=False)
+    count = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index("ix_time_to_answer_buckets_day_bucket", "day", "bucket", unique=True),
+    )
+
+class StudentActivity(Base):
+    """The last day each student sent a message, so daily actives are counted once."""
+    __tablename__ = "student_activity"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
+    last_active_on = Column(Date, nullable=False)
+
+class IngestionJob(Base):
+    """Progress of a bulk QA import, readable from any worker."""
+    __tablename__ = "ingestion_jobs"
+    
+    id = Column(String, primary_key=True)
+    filename = Column(String, nullable=False)
+    format = Column(String, nullable=False)
+    # queued -> running -> completed or failed
+    status = Column(String, default="queued", nullable=False)
+    rows_read = Column(Integer, default=0, nullable=False)
+    inserted = Column(Integer, default=0, nullable=False)
+    duplicates = Column(Integer, default=0, nullable=False)
+    skipped = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,256 @@
+import asyncio
+import json
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterator, List, Optional
+
+import pandas as pd
+import pdfplumber
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.database import SessionLocal
+from src.entities import IngestionJob, QAEntry
+from src.knowledge_base import bump_version, refresh_knowledge_base
+from src.retrieval import question_key
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".pdf": "pdf"}
+
+QUESTION_PREFIX = re.compile(r"^\s*(?:q|question)\s*[:.)-]\s*", re.IGNORECASE)
+ANSWER_PREFIX = re.compile(r"^\s*(?:a|answer)\s*[:.)-]\s*", re.IGNORECASE)
+
+# Written back to the ingestion_jobs row as the job goes
+PROGRESS_FIELDS = ("status", "rows_read", "inserted", "duplicates", "skipped", "error", "finished_at")
+
+_running_tasks: set = set()
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+
+def detect_format(filename: str) -> Optional[str]:
+    return SUPPORTED_FORMATS.get(os.path.splitext(filename or "")[1].lower())
+
+
+def parse_qa_text(text: str) -> List[dict]:
+    """
+    Pulls question/answer pairs out of free text such as a handbook FAQ.
+
+    A question starts at a line prefixed with "Q:"/"Question:" or at any line
+    ending with "?"; everything up to the next question is its answer.
+    """
+    pairs = []
+    question, answer_lines = None, []
+
+    def flush():
+        answer = " ".join(line for line in answer_lines if line).strip()
+        if question and answer:
+            pairs.append({"question": question, "answer": answer})
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        is_prefixed = bool(QUESTION_PREFIX.match(line))
+        if is_prefixed or line.endswith("?"):
+            flush()
+            question, answer_lines = QUESTION_PREFIX.sub("", line), []
+        elif question is not None:
+            answer_lines.append(ANSWER_PREFIX.sub("", line))
+    flush()
+    return pairs
+
+
+def extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    # Runs in a worker process, so it opens its own handle on the file
+    with pdfplumber.open(path) as pdf:
+        return [(page.extract_text() or "") for page in pdf.pages[start:end]]
+
+
+def count_pdf_pages(path: str) -> int:
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=settings.INGESTION_PDF_WORKERS)
+    return _pdf_pool
+
+
+def shutdown_ingestion():
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+
+def read_jsonl(path: str, job: IngestionJob) -> Iterator[List[dict]]:
+    batch = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                batch.append({"question": record["question"], "answer": record["answer"]})
+            except (ValueError, KeyError, TypeError):
+                job.skipped += 1
+                continue
+            if len(batch) >= settings.INGESTION_BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def read_csv(path: str, job: IngestionJob) -> Iterator[List[dict]]:
+    reader = pd.read_csv(
+        path,
+        dtype=str,
+        chunksize=settings.INGESTION_BATCH_SIZE,
+        usecols=lambda column: column.strip().lower() in ("question", "answer"),
+    )
+    for chunk in reader:
+        chunk.columns = [column.strip().lower() for column in chunk.columns]
+        if not {"question", "answer"} <= set(chunk.columns):
+            raise ValueError("CSV needs 'question' and 'answer' columns")
+        valid = chunk.dropna(subset=["question", "answer"])
+        job.skipped += len(chunk) - len(valid)
+        yield valid[["question", "answer"]].to_dict("records")
+
+
+async def iterate_in_thread(iterator: Iterator) -> AsyncIterator:
+    # Each step of a blocking reader runs in a worker thread, one batch at a time
+    sentinel = object()
+    while True:
+        batch = await asyncio.to_thread(next, iterator, sentinel)
+        if batch is sentinel:
+            return
+        yield batch
+
+
+async def read_pdf(path: str) -> AsyncIterator[List[dict]]:
+    loop = asyncio.get_running_loop()
+    pool = get_pdf_pool()
+    page_count = await loop.run_in_executor(pool, count_pdf_pages, path)
+    step = settings.INGESTION_PDF_PAGES_PER_TASK
+    futures = [
+        loop.run_in_executor(pool, extract_pdf_pages, path, start, min(start + step, page_count))
+        for start in range(0, page_count, step)
+    ]
+    # Pages are parsed in parallel but joined in order, since a question and
+    # its answer can straddle a page break
+    texts = []
+    for future in futures:
+        texts.extend(await future)
+    pairs = await asyncio.to_thread(parse_qa_text, "\n".join(texts))
+    for start in range(0, len(pairs), settings.INGESTION_BATCH_SIZE):
+        yield pairs[start:start + settings.INGESTION_BATCH_SIZE]
+
+
+def read_batches(job: IngestionJob, path: str) -> AsyncIterator[List[dict]]:
+    if job.format == "pdf":
+        return read_pdf(path)
+    if job.format == "csv":
+        return iterate_in_thread(read_csv(path, job))
+    return iterate_in_thread(read_jsonl(path, job))
+
+
+async def load_existing_questions() -> set:
+    async with SessionLocal() as db:
+        result = await db.stream_scalars(select(QAEntry.question))
+        return {question_key(question) async for question in result}
+
+
+async def save_progress(db: AsyncSession, job: IngestionJob):
+    await db.execute(
+        update(IngestionJob)
+        .where(IngestionJob.id == job.id)
+        .values({field: getattr(job, field) for field in PROGRESS_FIELDS})
+    )
+
+
+async def run_job(job: IngestionJob, path: str):
+    job.status = "running"
+    try:
+        async with SessionLocal() as db:
+            await save_progress(db, job)
+            await db.commit()
+        seen = await load_existing_questions()
+        async for batch in read_batches(job, path):
+            job.rows_read += len(batch)
+            rows = []
+            for pair in batch:
+                question, answer = str(pair["question"]).strip(), str(pair["answer"]).strip()
+                key = question_key(question)
+                if not question or not answer or not key:
+                    job.skipped += 1
+                elif key in seen:
+                    job.duplicates += 1
+                else:
+                    seen.add(key)
+                    rows.append({"question": question, "answer": answer})
+            if not rows:
+                continue
+
+            async with SessionLocal() as db:
+                result = await db.execute(
+                    insert(QAEntry).returning(QAEntry.id, QAEntry.question, QAEntry.answer),
+                    rows
+                )
+                new_entries = [row._asdict() for row in result]
+                version = await bump_version(db)
+                job.inserted += len(new_entries)
+                await save_progress(db, job)
+                await db.commit()
+            refresh_knowledge_base(new_entries, version)
+
+        job.status = "completed"
+        logger.info(
+            f"Ingestion job {job.id} finished: {job.inserted} inserted, "
+            f"{job.duplicates} duplicates, {job.skipped} skipped"
+        )
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        logger.error(f"Ingestion job {job.id} failed: {e}")
+    finally:
+        job.finished_at = datetime.now()
+        os.remove(path)
+        async with SessionLocal() as db:
+            await save_progress(db, job)
+            await db.commit()
+
+
+async def start_job(filename: str, file_format: str, path: str) -> IngestionJob:
+    """
+    Records the job, so any worker can report on it, and runs it in the
+    background. Jobs finished more than INGESTION_JOB_RETENTION_HOURS ago
+    are cleared out at the same time.
+    """
+    job = IngestionJob(
+        id=str(uuid.uuid4()),
+        filename=filename,
+        format=file_format,
+        status="queued",
+        rows_read=0,
+        inserted=0,
+        duplicates=0,
+        skipped=0,
+        created_at=datetime.now(),
+    )
+    cutoff = datetime.now() - timedelta(hours=settings.INGESTION_JOB_RETENTION_HOURS)
+    async with SessionLocal() as db:
+        await db.execute(delete(IngestionJob).where(IngestionJob.finished_at < cutoff))
+        db.add(job)
+        await db.commit()
+
+    task = asyncio.create_task(run_job(job, path))
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return job
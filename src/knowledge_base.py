@@ -0,0 +1,106 @@
+import time
+from typing import List
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.entities import KnowledgeBaseVersion, QAEntry
+from src.prompt_builder import prompt_builder
+from src.response_cache import response_cache
+from src.retrieval import qa_index
+import logging
+
+logger = logging.getLogger(__name__)
+
+VERSION_ROW_ID = 1
+
+# Monotonic time of the last comparison against the database version
+_last_sync = 0.0
+
+
+async def get_db_version(db: AsyncSession) -> int:
+    version = await db.scalar(
+        select(KnowledgeBaseVersion.version).where(KnowledgeBaseVersion.id == VERSION_ROW_ID)
+    )
+    return version or 0
+
+
+async def bump_version(db: AsyncSession) -> int:
+    """
+    Increments the shared knowledge-base version. Call it inside the
+    transaction that changes QAEntry rows and pass the result to
+    refresh_knowledge_base once that transaction commits.
+    """
+    version = await db.scalar(
+        update(KnowledgeBaseVersion)
+        .where(KnowledgeBaseVersion.id == VERSION_ROW_ID)
+        .values(version=KnowledgeBaseVersion.version + 1)
+        .returning(KnowledgeBaseVersion.version)
+    )
+    if version is None:
+        db.add(KnowledgeBaseVersion(id=VERSION_ROW_ID, version=1))
+        version = 1
+    return version
+
+
+async def load_knowledge_base(db: AsyncSession):
+    global _last_sync
+    # Read the version first: a change that lands mid-load leaves us behind, not ahead
+    version = await get_db_version(db)
+    rows = (await db.execute(select(QAEntry.id, QAEntry.question, QAEntry.answer))).all()
+    entries = [row._asdict() for row in rows]
+    qa_index.load(entries)
+    prompt_builder.load(entries, version)
+    response_cache.clear()
+    _last_sync = time.monotonic()
+    logger.info(f"Knowledge base loaded at version {version}")
+
+
+async def sync_knowledge_base(db: AsyncSession):
+    """
+    Loads the knowledge base on first use and reloads it when another worker
+    has changed it, checking the database at most every KB_SYNC_INTERVAL_SECONDS.
+    """
+    global _last_sync
+    if not qa_index.loaded:
+        await load_knowledge_base(db)
+        return
+    if time.monotonic() - _last_sync < settings.KB_SYNC_INTERVAL_SECONDS:
+        return
+
+    _last_sync = time.monotonic()
+    if await get_db_version(db) != prompt_builder.version:
+        logger.info("Knowledge base changed on another worker, reloading")
+        await load_knowledge_base(db)
+
+
+async def retrieve_qa_data(db: AsyncSession, question: str) -> List[dict]:
+    await sync_knowledge_base(db)
+    return qa_index.search(question)
+
+
+def refresh_knowledge_base(new_entries: List[dict], version: int):
+    """Applies committed QAEntry inserts/edits to this worker's in-memory copies."""
+    global _last_sync
+    response_cache.clear()
+    # Until the first load there is nothing to patch; load() will pick these up
+    if not qa_index.loaded:
+        return
+
+    qa_index.add(new_entries)
+    if version == prompt_builder.version + 1:
+        prompt_builder.update(new_entries, version)
+    else:
+        # Some other worker changed the knowledge base in between, so patching
+        # would still leave us behind: force a full resync on the next request
+        prompt_builder.update(new_entries, prompt_builder.version)
+        _last_sync = 0.0
+
+
+def knowledge_base_status() -> dict:
+    return {
+        "version": prompt_builder.version,
+        "loaded": qa_index.loaded,
+        "entries": len(qa_index),
+    }
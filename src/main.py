@@ -1,15 +1,52 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from src.config import settings, app_configs
 from contextlib import asynccontextmanager
 from src.logging_config import setup_logging
 from fastapi.middleware.cors import CORSMiddleware
 from src.router import app_router
+from src.bot_service import openrouter_service
+from src.database import engine
+from src.ingestion import shutdown_ingestion
+from src.notification_service import email_notifier
+from src.metrics import HTTP_REQUEST_SECONDS, registry, start_trace
+from src.warmup import warm_up_until_ready, warmup_state
+from src.summaries import stop_summary_refreshes
+from src.archive import start_archiver, stop_archiver
+from src.outbox import outbox_worker
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def prepare_worker():
+    await warm_up_until_ready()
+    # Both need the schema, so they wait for warm-up
+    outbox_worker.start()
+    start_archiver()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     setup_logging()
+    # Warm-up runs in the background so the worker accepts connections right
+    # away: /healthcheck answers and /readyz reports 503 until it is done
+    warmup_task = asyncio.create_task(prepare_worker())
     yield
+    # Fail readiness first so the load balancer stops routing here while we drain
+    warmup_state.ready = False
+    warmup_task.cancel()
+    await asyncio.gather(warmup_task, return_exceptions=True)
+    await stop_archiver()
+    # Anything still queued is picked up again by the next worker to start
+    await outbox_worker.stop()
+    email_notifier.close()
+    await stop_summary_refreshes()
+    await openrouter_service.close()
+    shutdown_ingestion()
+    await engine.dispose()
 
 app = FastAPI(**app_configs, lifespan=lifespan,)
 app.include_router(app_router, prefix="/api", tags=["app"])
@@ -23,6 +60,27 @@ app.add_middleware(
     allow_headers=settings.CORS_HEADERS,
 )
 
+
+@app.middleware("http")
+async def record_request_timings(request: Request, call_next):
+    trace = start_trace()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+
+    # Label by route template rather than raw path to keep the series bounded
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", "unmatched")
+    HTTP_REQUEST_SECONDS.observe(
+        elapsed, method=request.method, route=route_path, status=response.status_code
+    )
+    if settings.SLOW_REQUEST_THRESHOLD_MS and elapsed * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+        logger.warning(
+            f"Slow request {request.method} {route_path} took {elapsed * 1000:.1f}ms: {trace.summary()}"
+        )
+    return response
+
+
 # --- Base Routes
 @app.get("/", include_in_schema=False)
 async def root() -> dict[str, str]:
@@ -33,4 +91,14 @@ async def root() -> dict[str, str]:
 
 @app.get("/healthcheck")
 async def healthcheck() -> dict[str, str]:
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz() -> JSONResponse:
+    return JSONResponse(warmup_state.as_dict(), status_code=200 if warmup_state.ready else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
@@ -0,0 +1,242 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+
+# Metrics are per process; with several uvicorn workers each one exposes its own
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 16000)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # Per label set: per-bucket counts (last slot is +Inf), sum, count
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "chatbot_http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status")
+))
+STAGE_SECONDS = registry.register(Histogram(
+    "chatbot_request_stage_duration_seconds", "Time spent in each stage of a request.", ("stage",)
+))
+LLM_REQUEST_SECONDS = registry.register(Histogram(
+    "chatbot_llm_request_duration_seconds", "OpenRouter call latency, retries included.", ("mode", "outcome")
+))
+LLM_MODEL_SECONDS = registry.register(Histogram(
+    "chatbot_llm_model_request_duration_seconds", "Per-model OpenRouter call latency.", ("model", "outcome")
+))
+LLM_HEDGES = registry.register(Counter(
+    "chatbot_llm_hedged_requests_total", "Hedged requests sent to a backup model, by the model that answered.",
+    ("winner",)
+))
+LLM_PROMPT_TOKENS = registry.register(Histogram(
+    "chatbot_llm_prompt_tokens", "Estimated prompt size sent to the model.", buckets=TOKEN_BUCKETS
+))
+DB_QUERY_SECONDS = registry.register(Histogram(
+    "chatbot_db_query_duration_seconds", "Time spent executing individual SQL statements."
+))
+LLM_ERRORS = registry.register(Counter(
+    "chatbot_llm_errors_total", "OpenRouter calls that ended in the fallback response.", ("mode", "error")
+))
+LLM_COALESCED = registry.register(Counter(
+    "chatbot_llm_coalesced_total", "Requests that shared another request's in-flight OpenRouter call."
+))
+SUMMARY_REFRESHES = registry.register(Counter(
+    "chatbot_summary_refreshes_total", "Background conversation summary refreshes.", ("outcome",)
+))
+OUTBOX_EVENTS = registry.register(Counter(
+    "chatbot_outbox_events_total", "Outbox events processed, by outcome.", ("event_type", "outcome")
+))
+CHAT_EXCHANGES = registry.register(Counter(
+    "chatbot_chat_exchanges_total", "Recorded question/reply pairs.", ("outcome", "source")
+))
+RATE_LIMITED = registry.register(Counter(
+    "chatbot_rate_limited_total", "Requests rejected with 429, by limit.", ("limit",)
+))
+ADMISSION_REJECTIONS = registry.register(Counter(
+    "chatbot_admission_rejections_total", "LLM-bound requests shed with 503.", ("reason",)
+))
+DIRECT_ANSWERS = registry.register(Counter(
+    "chatbot_direct_answers_total", "Replies served straight from a QA entry without the LLM."
+))
+ESCALATIONS = registry.register(Counter(
+    "chatbot_unanswered_escalations_total", "Questions the bot could not answer.", ("new_cluster",)
+))
+
+
+class RequestTrace:
+    """Per-stage timings of one request, in seconds."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.db_seconds = 0.0
+        self.db_queries = 0
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self) -> str:
+        parts = [f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.stages.items()]
+        parts.append(f"db={self.db_seconds * 1000:.1f}ms/{self.db_queries}q")
+        return " ".join(parts)
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar(
+    "request_trace", default=None
+)
+
+
+def start_trace() -> RequestTrace:
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Times a block into STAGE_SECONDS and the current request's trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def record_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+def record_db_query(seconds: float):
+    DB_QUERY_SECONDS.observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.db_seconds += seconds
+        trace.db_queries += 1
+
+
+def instrument_engine(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_db_query(time.perf_counter() - conn.info["query_started"].pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            record_db_query(time.perf_counter() - started.pop())
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timedelta
+from typing import Optional
 
 class UserCreate(BaseModel):
     username: str
@@ -29,6 +30,50 @@ class UnansweredQuestionResponse(BaseModel):
     user_id: int
     created_at: datetime
     is_answered: bool
+    cluster_id: Optional[int] = None
+
+class UnansweredClusterResponse(BaseModel):
+    id: int
+    question: str
+    question_count: int
+    created_at: datetime
+    updated_at: datetime
+    is_answered: bool
+
+class MessageArchiveResponse(BaseModel):
+    id: int
+    filename: str
+    message_count: int
+    min_message_id: int
+    max_message_id: int
+    oldest_created_at: datetime
+    newest_created_at: datetime
+    size_bytes: int
+    created_at: datetime
+
+class OutboxEventResponse(BaseModel):
+    id: int
+    event_type: str
+    idempotency_key: str
+    status: str
+    attempts: int
+    available_at: datetime
+    last_error: Optional[str] = None
+    created_at: datetime
+    processed_at: Optional[datetime] = None
+
+class IngestionJobResponse(BaseModel):
+    id: str
+    filename: str
+    format: str
+    status: str
+    rows_read: int
+    inserted: int
+    duplicates: int
+    skipped: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
 
 class AnswerQuestion(BaseModel):
     answer: str
@@ -0,0 +1,113 @@
+import smtplib
+import threading
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Optional
+
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+SMTP_SERVER = settings.SMTP_SERVER
+SMTP_PORT = settings.SMTP_PORT
+SMTP_USERNAME = settings.SMTP_USERNAME
+SMTP_PASSWORD = settings.SMTP_PASSWORD
+ADMIN_EMAIL = settings.ADMIN_EMAIL
+
+
+class EmailNotifier:
+    """
+    Sends admin notifications over SMTP. Several notifications with the same
+    subject are coalesced into one digest email. The authenticated
+    connection is kept open between sends and re-established only when it
+    has dropped.
+    """
+
+    def __init__(self):
+        self._smtp: Optional[smtplib.SMTP] = None
+        # deliver() is called from outbox worker threads; they share the connection
+        self._lock = threading.Lock()
+        self.sent = 0
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    def deliver(self, notifications: list):
+        """
+        Sends (subject, body, digest_subject) notifications right away, one
+        digest per subject, and raises if any email could not be sent.
+        digest_subject is used when a notification is coalesced with others of
+        the same subject; "{count}" is replaced with the number of them.
+        Blocking; call it from a worker thread.
+        """
+        if not all([SMTP_USERNAME, ADMIN_EMAIL]):
+            logger.warning("Email configuration missing")
+            return
+
+        grouped: dict[str, list] = {}
+        for subject, body, digest_subject in notifications:
+            grouped.setdefault(subject, []).append((body, digest_subject))
+
+        with self._lock:
+            for subject, items in grouped.items():
+                if len(items) == 1:
+                    self._send(subject, items[0][0])
+                    continue
+                digest_subject = items[0][1] or f"{{count}} x {subject}"
+                bodies = "\n\n---\n\n".join(body for body, _ in items)
+                self._send(digest_subject.format(count=len(items)), bodies)
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            self._disconnect()
+
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+        server.ehlo()
+        if settings.SMTP_USE_TLS:
+            server.starttls()
+            server.ehlo()
+        if SMTP_PASSWORD and server.has_extn("auth"):
+            server.login(SMTP_USERNAME, SMTP_PASSWORD)
+        self._smtp = server
+        return server
+
+    def _disconnect(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._smtp = None
+
+    def _send(self, subject: str, body: str):
+        msg = MIMEMultipart()
+        msg['From'] = SMTP_USERNAME
+        msg['To'] = ADMIN_EMAIL
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+
+        # One retry on a fresh connection in case the server dropped us between checks
+        for attempt in range(2):
+            try:
+                self._connection().sendmail(SMTP_USERNAME, ADMIN_EMAIL, msg.as_string())
+                self.sent += 1
+                logger.info("Email sent successfully")
+                return
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                self._disconnect()
+                error = e
+            except Exception as e:
+                error = e
+                break
+        raise error
+
+
+email_notifier = EmailNotifier()
@@ -0,0 +1,299 @@
+import asyncio
+import json
+import time
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.analytics import record_exchange
+from src.clustering import assign_cluster, cluster_index
+from src.config import settings
+from src.database import SessionLocal
+from src.entities import OutboxEvent, UnansweredQuestion
+from src.metrics import CHAT_EXCHANGES, ESCALATIONS, OUTBOX_EVENTS
+from src.notification_service import email_notifier
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENT_CHAT_EXCHANGE = "chat.exchange"
+EVENT_ESCALATION = "question.escalated"
+EVENT_ADMIN_NOTIFICATION = "admin.notification"
+
+CLAIMABLE_STATUSES = ("pending", "processing")
+
+# How often done events older than OUTBOX_RETENTION_HOURS are deleted
+CLEANUP_INTERVAL_SECONDS = 60 * 60
+
+# A handler runs inside the transaction that marks its event done and may
+# return a callback to run once that transaction has committed
+Handler = Callable[[AsyncSession, dict], Awaitable[Optional[Callable[[], None]]]]
+HANDLERS: Dict[str, Handler] = {}
+
+
+def handler(event_type: str):
+    def register(fn: Handler) -> Handler:
+        HANDLERS[event_type] = fn
+        return fn
+    return register
+
+
+def outbox_event(event_type: str, idempotency_key: str, payload: dict, delay: float = 0.0) -> OutboxEvent:
+    """
+    Builds an event to add to the session whose transaction it belongs to.
+    The idempotency key is unique, so the same side effect can't be queued twice.
+    """
+    return OutboxEvent(
+        event_type=event_type,
+        idempotency_key=idempotency_key,
+        payload=json.dumps(payload, default=str),
+        available_at=datetime.now() + timedelta(seconds=delay),
+    )
+
+
+@handler(EVENT_CHAT_EXCHANGE)
+async def handle_chat_exchange(db: AsyncSession, payload: dict):
+    day = date.fromisoformat(payload["day"]) if "day" in payload else date.today()
+    await record_exchange(db, day, payload["user_id"], payload["outcome"], payload["source"])
+    CHAT_EXCHANGES.inc(outcome=payload["outcome"], source=payload["source"])
+
+
+@handler(EVENT_ESCALATION)
+async def handle_escalation(db: AsyncSession, payload: dict):
+    question = payload["question"]
+    logger.info(f"New unanswered question: {question}")
+    cluster_id, is_new_cluster = await assign_cluster(db, question)
+    db.add(UnansweredQuestion(
+        question=question,
+        user_id=payload["user_id"],
+        cluster_id=cluster_id
+    ))
+    ESCALATIONS.inc(new_cluster=str(is_new_cluster).lower())
+
+    # Repeats of an already-reported question only bump the cluster count
+    if not is_new_cluster:
+        return None
+    db.add(outbox_event(
+        EVENT_ADMIN_NOTIFICATION,
+        f"notify:cluster:{cluster_id}",
+        {
+            "subject": "New Unanswered Question",
+            "body": f"A student asked: {question}\n\nPlease log into the admin dashboard to provide an answer.",
+            "digest_subject": "{count} new unanswered questions",
+        },
+        # Held back so notifications arriving close together go out as one digest
+        delay=settings.NOTIFICATION_FLUSH_INTERVAL_SECONDS,
+    ))
+    return lambda: cluster_index.add(cluster_id, question)
+
+
+def retry_delay(attempts: int) -> float:
+    return min(
+        settings.OUTBOX_RETRY_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0)),
+        settings.OUTBOX_RETRY_MAX_BACKOFF_SECONDS,
+    )
+
+
+class OutboxWorker:
+    """
+    Carries out outbox events in the background with retries.
+
+    Events are claimed with a lease: a claimed event whose worker dies is
+    picked up again once OUTBOX_LEASE_SECONDS have passed, which is also
+    how events left behind by a restart are recovered. Database side effects
+    commit together with the event being marked done, so they happen exactly
+    once; email is at least once.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_cleanup = 0.0
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Outbox worker started")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info("Outbox worker stopped")
+
+    def notify(self):
+        """Wakes the worker up early after a request has queued events."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                processed = await self.process_due()
+                if time.monotonic() - self._last_cleanup >= CLEANUP_INTERVAL_SECONDS:
+                    await self.cleanup()
+            except Exception as e:
+                logger.error(f"Outbox processing failed: {e}")
+                processed = 0
+            if processed:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.OUTBOX_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_due(self) -> int:
+        events = await self._claim(
+            OutboxEvent.event_type != EVENT_ADMIN_NOTIFICATION,
+            OutboxEvent.available_at <= datetime.now(),
+        )
+        for event in events:
+            await self._handle(event)
+        return len(events) + await self._process_notifications()
+
+    async def _claim(self, *conditions) -> List[OutboxEvent]:
+        now = datetime.now()
+        async with SessionLocal() as db:
+            candidates = (
+                select(OutboxEvent.id)
+                .where(OutboxEvent.status.in_(CLAIMABLE_STATUSES), *conditions)
+                .order_by(OutboxEvent.id)
+                .limit(settings.OUTBOX_BATCH_SIZE)
+                .scalar_subquery()
+            )
+            # The conditions are checked again by the UPDATE itself, so two
+            # workers racing for the same rows can't both claim them
+            result = await db.scalars(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(candidates), OutboxEvent.status.in_(CLAIMABLE_STATUSES), *conditions)
+                .values(
+                    status="processing",
+                    attempts=OutboxEvent.attempts + 1,
+                    available_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+                )
+                .returning(OutboxEvent)
+                .execution_options(synchronize_session=False)
+            )
+            events = result.all()
+            await db.commit()
+        return events
+
+    async def _mark_done(self, db: AsyncSession, events: List[OutboxEvent]) -> bool:
+        marked = 0
+        for event in events:
+            result = await db.execute(
+                update(OutboxEvent)
+                .where(
+                    OutboxEvent.id == event.id,
+                    OutboxEvent.status == "processing",
+                    OutboxEvent.attempts == event.attempts,
+                )
+                .values(status="done", processed_at=datetime.now(), last_error=None)
+            )
+            marked += result.rowcount
+        return marked == len(events)
+
+    async def _handle(self, event: OutboxEvent):
+        try:
+            async with SessionLocal() as db:
+                after_commit = await HANDLERS[event.event_type](db, json.loads(event.payload))
+                if not await self._mark_done(db, [event]):
+                    # Our lease ran out and another worker has the event now
+                    await db.rollback()
+                    return
+                await db.commit()
+        except Exception as e:
+            await self._fail([event], e)
+            return
+
+        OUTBOX_EVENTS.inc(event_type=event.event_type, outcome="done")
+        if after_commit is not None:
+            after_commit()
+
+    async def _process_notifications(self) -> int:
+        """
+        Once any admin notification is due, every pending one that hasn't
+        been tried yet is sent with it, so a burst of escalations turns into
+        a single digest email. Ones that failed before wait out their backoff.
+        """
+        now = datetime.now()
+        async with SessionLocal() as db:
+            due = await db.scalar(
+                select(OutboxEvent.id)
+                .where(
+                    OutboxEvent.event_type == EVENT_ADMIN_NOTIFICATION,
+                    OutboxEvent.status.in_(CLAIMABLE_STATUSES),
+                    OutboxEvent.available_at <= now,
+                )
+                .limit(1)
+            )
+        if due is None:
+            return 0
+
+        # Processing events whose lease hasn't run out belong to another
+        # worker; for pending ones never tried, available_at is only the
+        # digest hold-back and can be cut short
+        events = await self._claim(
+            OutboxEvent.event_type == EVENT_ADMIN_NOTIFICATION,
+            or_(
+                OutboxEvent.available_at <= now,
+                and_(OutboxEvent.status == "pending", OutboxEvent.attempts == 0),
+            ),
+        )
+        if not events:
+            return 0
+
+        try:
+            notifications = [
+                (payload["subject"], payload["body"], payload.get("digest_subject"))
+                for payload in (json.loads(event.payload) for event in events)
+            ]
+            await asyncio.to_thread(email_notifier.deliver, notifications)
+        except Exception as e:
+            await self._fail(events, e)
+            return len(events)
+
+        async with SessionLocal() as db:
+            await self._mark_done(db, events)
+            await db.commit()
+        OUTBOX_EVENTS.inc(len(events), event_type=EVENT_ADMIN_NOTIFICATION, outcome="done")
+        return len(events)
+
+    async def _fail(self, events: List[OutboxEvent], error: Exception):
+        now = datetime.now()
+        async with SessionLocal() as db:
+            for event in events:
+                exhausted = event.attempts >= settings.OUTBOX_MAX_ATTEMPTS
+                await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id == event.id, OutboxEvent.attempts == event.attempts)
+                    .values(
+                        status="failed" if exhausted else "pending",
+                        available_at=now + timedelta(seconds=retry_delay(event.attempts)),
+                        last_error=repr(error)[:1000],
+                    )
+                )
+                OUTBOX_EVENTS.inc(event_type=event.event_type, outcome="failed" if exhausted else "retry")
+            await db.commit()
+        logger.warning(f"{len(events)} outbox event(s) of type {events[0].event_type} failed: {error!r}")
+
+    async def cleanup(self):
+        self._last_cleanup = time.monotonic()
+        cutoff = datetime.now() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+        async with SessionLocal() as db:
+            result = await db.execute(
+                delete(OutboxEvent).where(OutboxEvent.status == "done", OutboxEvent.processed_at < cutoff)
+            )
+            await db.commit()
+        if result.rowcount:
+            logger.info(f"Deleted {result.rowcount} processed outbox events")
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,72 @@
+import base64
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, bindparam, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+
+
+class PageParams:
+    """Query parameters shared by every cursor-paginated listing."""
+
+    def __init__(
+        self,
+        limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+        cursor: Optional[str] = Query(None),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def paginate(db: AsyncSession, stmt, model, page: PageParams, descending: bool = True):
+    """
+    Keyset pagination over (created_at, id). Returns the rows of one page and
+    the cursor for the next one, or None when this is the last page.
+    """
+    created_at, row_id = model.created_at, model.id
+
+    if page.cursor:
+        cursor_created_at, cursor_id = decode_cursor(page.cursor)
+        cursor_created_at = bindparam("cursor_created_at", cursor_created_at, type_=created_at.type)
+        if db.bind.dialect.name == "sqlite":
+            # SQLite keeps datetimes as text, and CURRENT_TIMESTAMP defaults are
+            # formatted differently from bound values, so compare them as numbers
+            created_at, cursor_created_at = func.julianday(created_at), func.julianday(cursor_created_at)
+        if descending:
+            stmt = stmt.where(or_(
+                created_at < cursor_created_at,
+                and_(created_at == cursor_created_at, row_id < cursor_id),
+            ))
+        else:
+            stmt = stmt.where(or_(
+                created_at > cursor_created_at,
+                and_(created_at == cursor_created_at, row_id > cursor_id),
+            ))
+
+    if descending:
+        stmt = stmt.order_by(model.created_at.desc(), row_id.desc())
+    else:
+        stmt = stmt.order_by(model.created_at, row_id)
+
+    rows = (await db.scalars(stmt.limit(page.limit + 1))).all()
+    if len(rows) <= page.limit:
+        return rows, None
+
+    rows = rows[:page.limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
@@ -0,0 +1,68 @@
+import threading
+from typing import Iterable, List
+
+from cachetools import LRUCache
+
+SYSTEM_PROMPT_HEADER = "You are a helpful university chatbot assistant. You can answer questions based on the following Q&A database:"
+
+SYSTEM_PROMPT_RULES = """Rules:
+1. Only answer questions based on the provided Q&A database. Don't say you ae using a database source. Make it natural and if you are asked something else that is not relating to enquiries on the MIT University of lagos program, say you are desinged only to provide answers for this program.
+2. Be friendly and helpful in your responses. You can add a bit of humor to make the conversation more engaging.
+3. If you cannot find the answer in the database, respond with exactly: "I don't know the answer to that question yet, but don't worry! Please reach back out in the next 24-48 hours as I will inform our admin team to provide you with an accurate answer."
+4. Do not provide information outside of the Q&A database
+5. Keep responses concise but informative and engaging. Format your responses in a way that is easy to read and understand. Add paragraphs where appropriate.
+"""
+
+
+def render_entry(entry: dict) -> str:
+    return f"Q: {entry['question']}\nA: {entry['answer']}\n"
+
+
+class PromptBuilder:
+    """
+    Keeps every QA entry pre-rendered and the assembled system prompts for
+    recently retrieved entry sets cached, so a request only pays for joining
+    the conversation history on.
+
+    `version` is the knowledge-base version the rendered blocks reflect; it
+    only moves through load() and update().
+    """
+
+    def __init__(self, cache_size: int = 512):
+        self._lock = threading.Lock()
+        self._blocks: dict[int, str] = {}
+        self._prompts: LRUCache = LRUCache(maxsize=cache_size)
+        self.version = 0
+
+    def load(self, entries: Iterable[dict], version: int):
+        blocks = {entry["id"]: render_entry(entry) for entry in entries}
+        with self._lock:
+            self._blocks = blocks
+            self._prompts.clear()
+            self.version = version
+
+    def update(self, entries: Iterable[dict], version: int):
+        """Re-renders only the added or edited entries."""
+        with self._lock:
+            for entry in entries:
+                self._blocks[entry["id"]] = render_entry(entry)
+            self._prompts.clear()
+            self.version = version
+
+    def system_prompt(self, qa_entries: List[dict]) -> str:
+        key = tuple(entry["id"] for entry in qa_entries)
+        with self._lock:
+            prompt = self._prompts.get(key)
+            if prompt is None:
+                blocks = "\n".join(
+                    self._blocks.get(entry["id"]) or render_entry(entry) for entry in qa_entries
+                )
+                prompt = f"{SYSTEM_PROMPT_HEADER}\n\n{blocks}\n\n{SYSTEM_PROMPT_RULES}"
+                self._prompts[key] = prompt
+            return prompt
+
+    def build_messages(self, messages: List[dict], qa_entries: List[dict]) -> List[dict]:
+        return [{"role": "system", "content": self.system_prompt(qa_entries)}] + messages
+
+
+prompt_builder = PromptBuilder()
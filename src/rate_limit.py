@@ -0,0 +1,203 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from src.config import settings
+from src.metrics import ADMISSION_REJECTIONS, RATE_LIMITED, record_stage
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by client. Each key starts with `burst` tokens, one
+    request takes one, and they refill at `per_minute`. Only the
+    RATE_LIMIT_MAX_KEYS most recently seen keys are kept; a key that was
+    dropped starts over with a full bucket.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: int):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = max(burst, 1)
+        # key -> (tokens, monotonic time they were counted at)
+        self._buckets: OrderedDict[str, Tuple[float, float]] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _tokens(self, key: str, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return float(self.burst)
+        tokens, counted_at = bucket
+        return min(self.burst, tokens + (now - counted_at) * self.rate)
+
+    def wait_time(self, key: str) -> float:
+        """Seconds until `key` has a token again; 0 if it has one now."""
+        return max(0.0, (1 - self._tokens(key, time.monotonic())) / self.rate)
+
+    def take(self, key: str):
+        now = time.monotonic()
+        self._buckets[key] = (self._tokens(key, now) - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > settings.RATE_LIMIT_MAX_KEYS:
+            self._buckets.popitem(last=False)
+
+
+message_user_limiter = RateLimiter(
+    "message_user", settings.RATE_LIMIT_MESSAGE_PER_MINUTE, settings.RATE_LIMIT_MESSAGE_BURST
+)
+message_ip_limiter = RateLimiter(
+    "message_ip", settings.RATE_LIMIT_MESSAGE_IP_PER_MINUTE, settings.RATE_LIMIT_MESSAGE_IP_BURST
+)
+auth_ip_limiter = RateLimiter(
+    "auth_ip", settings.RATE_LIMIT_AUTH_IP_PER_MINUTE, settings.RATE_LIMIT_AUTH_IP_BURST
+)
+
+
+def client_ip(request: Request) -> str:
+    # Behind a proxy this is only the real client with uvicorn --proxy-headers
+    return request.client.host if request.client else "unknown"
+
+
+def enforce_rate_limits(*checks: Tuple[RateLimiter, str]):
+    """
+    Takes a token from each (limiter, key) bucket, or raises 429 with
+    Retry-After if any of them is empty. Nothing is taken from the others
+    when one of them turns the request away.
+    """
+    checks = [(limiter, key) for limiter, key in checks if limiter.enabled]
+    for limiter, key in checks:
+        wait = limiter.wait_time(key)
+        if wait > 0:
+            RATE_LIMITED.inc(limit=limiter.name)
+            logger.info(f"Rate limit {limiter.name} hit by {key}")
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please slow down",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+    for limiter, key in checks:
+        limiter.take(key)
+
+
+def limit_chat(request: Request, user_identifier: str):
+    enforce_rate_limits(
+        (message_user_limiter, user_identifier),
+        (message_ip_limiter, client_ip(request)),
+    )
+
+
+def limit_auth(request: Request):
+    enforce_rate_limits((auth_ip_limiter, client_ip(request)))
+
+
+class AdmissionQueue:
+    """
+    Admits at most `capacity` LLM-bound requests at once, with a bounded
+    first-come-first-served queue behind them. A request that finds the
+    queue full, or waits longer than `timeout`, is shed straight away with
+    503 and a Retry-After estimated from how long requests hold a slot,
+    rather than piling up until the client gives up.
+    """
+
+    def __init__(self, capacity: int, queue_size: int, timeout: float):
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._waiters: deque = deque()
+        # Moving average of how long a request holds its slot
+        self._hold_seconds: Optional[float] = None
+
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def retry_after(self) -> int:
+        # Roughly how long until the requests queued now have been served
+        hold = self._hold_seconds or 1.0
+        return max(1, math.ceil((self.waiting() + 1) / self.capacity * hold))
+
+    def _reject(self, reason: str) -> HTTPException:
+        self.rejected += 1
+        ADMISSION_REJECTIONS.inc(reason=reason)
+        logger.warning(
+            f"Shedding LLM-bound request ({reason}): {self.active} active, {self.waiting()} waiting"
+        )
+        return HTTPException(
+            status_code=503,
+            detail="The assistant is busy right now, please try again shortly",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def acquire(self) -> float:
+        """Waits for a slot and returns when it was granted, for release()."""
+        started = time.perf_counter()
+        if self.active < self.capacity and not self.waiting():
+            self.active += 1
+        else:
+            if self.waiting() >= self.queue_size:
+                raise self._reject("queue_full")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # The slot is handed over by release(), so active already counts us
+                await asyncio.wait_for(waiter, self.timeout)
+            except asyncio.TimeoutError:
+                # The slot may have been handed over just as the wait ran out
+                if waiter.cancelled() or not waiter.done():
+                    raise self._reject("timeout") from None
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.release(time.perf_counter())
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.admitted += 1
+        granted = time.perf_counter()
+        record_stage("admission_wait", granted - started)
+        return granted
+
+    def release(self, granted: float):
+        held = time.perf_counter() - granted
+        self._hold_seconds = held if self._hold_seconds is None else 0.9 * self._hold_seconds + 0.1 * held
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        granted = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(granted)
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "waiting": self.waiting(),
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+llm_admission = AdmissionQueue(
+    settings.LLM_MAX_CONCURRENCY, settings.LLM_ADMISSION_QUEUE_SIZE, settings.LLM_ADMISSION_TIMEOUT_SECONDS
+)
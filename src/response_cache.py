@@ -0,0 +1,104 @@
+import threading
+from typing import Optional
+
+from cachetools import TTLCache
+
+from src.config import settings
+from src.retrieval import MEANING_WORDS, question_key
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    LRU/TTL cache of bot replies keyed on the normalized question text.
+
+    Optionally falls back to a near-duplicate lookup (Jaccard similarity of
+    the question token sets) so that small rewordings still hit. Keys keep
+    interrogatives and negations, and a near-duplicate must use the same
+    ones.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = settings.RESPONSE_CACHE_SIZE,
+        ttl: float = settings.RESPONSE_CACHE_TTL_SECONDS,
+        similarity: float = settings.RESPONSE_CACHE_SIMILARITY,
+        min_tokens: int = settings.RESPONSE_CACHE_MIN_TOKENS,
+    ):
+        self.similarity = similarity
+        self.min_tokens = min_tokens
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def key_for(self, question: str) -> Optional[str]:
+        """
+        Returns the cache key for a question, or None when the question is too
+        short to be answered without the rest of the conversation.
+        """
+        key = question_key(question)
+        if len(key.split()) < self.min_tokens:
+            return None
+        return key
+
+    def get(self, question: str) -> Optional[str]:
+        key = self.key_for(question)
+        if key is None:
+            return None
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+
+            if self.similarity < 1:
+                entry = self._nearest(set(key.split()))
+                if entry is not None:
+                    self.near_hits += 1
+                    return entry[1]
+
+            self.misses += 1
+            return None
+
+    def _nearest(self, tokens: set) -> Optional[tuple]:
+        best, best_score = None, self.similarity
+        # However similar the rest, "when" and "where" ask different things
+        meaning = tokens & MEANING_WORDS
+        for entry in self._cache.values():
+            cached_tokens = entry[0]
+            if cached_tokens & MEANING_WORDS != meaning:
+                continue
+            score = len(tokens & cached_tokens) / len(tokens | cached_tokens)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def set(self, question: str, response: str):
+        key = self.key_for(question)
+        if key is None:
+            return
+        with self._lock:
+            self._cache[key] = (frozenset(key.split()), response)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+        logger.info("Response cache invalidated")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
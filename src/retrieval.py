@@ -0,0 +1,175 @@
+import re
+import threading
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from src.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that carry no signal for matching a student question to a QA entry
+STOP_WORDS = frozenset(
+    """
+    a an and are as at be by can do does for from how i if in is it me my of on or
+    please so that the their there this to us was we what when where which who why
+    will with you your
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOP_WORDS
+    ]
+
+
+# Words that change what a question asks. Ranking can ignore them, but two
+# questions that differ in one of them are not the same question
+QUESTION_WORDS = frozenset("how what when where which who whom whose why".split())
+NEGATIONS = frozenset("no not never nor none cannot".split())
+MEANING_WORDS = QUESTION_WORDS | NEGATIONS
+KEY_STOP_WORDS = STOP_WORDS - MEANING_WORDS
+NEGATED_CONTRACTION = re.compile(r"n['’]t\b")
+
+
+def question_tokens(text: str) -> List[str]:
+    """
+    tokenize() for deciding whether two questions ask the same thing:
+    interrogatives and negations are kept, and "isn't" reads as "is not".
+    """
+    text = NEGATED_CONTRACTION.sub(" not", text.lower())
+    return [token for token in TOKEN_PATTERN.findall(text) if token not in KEY_STOP_WORDS]
+
+
+def question_key(text: str) -> str:
+    return " ".join(question_tokens(text))
+
+
+class QAIndex:
+    """
+    In-process BM25 index over QAEntry rows.
+
+    Postings are kept per term so new entries can be appended without
+    re-scoring the whole corpus; scoring a query only touches the postings of
+    the query terms.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._entries: List[dict] = []
+        self._doc_lengths: List[int] = []
+        self._postings: dict[str, tuple[list, list]] = {}
+        self._positions: dict[int, int] = {}
+        # Slots of documents superseded by an edit
+        self._replaced: set[int] = set()
+        self._total_length = 0
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def load(self, entries: Iterable[dict]):
+        with self._lock:
+            self._reset()
+            self._add(entries)
+            self.loaded = True
+        logger.info(f"QA index built with {len(self)} entries")
+
+    def add(self, entries: Iterable[dict]):
+        """Adds new entries, replacing any already indexed under the same id."""
+        with self._lock:
+            self._add(entries)
+
+    def _add(self, entries: Iterable[dict]):
+        for entry in entries:
+            previous = self._positions.get(entry["id"])
+            if previous is not None:
+                self._remove(previous)
+
+            doc_index = len(self._entries)
+            self._positions[entry["id"]] = doc_index
+            question, answer = entry["question"], entry["answer"] or ""
+            self._entries.append(
+                {"id": entry["id"], "question": question, "answer": answer}
+            )
+            # The question is what students paraphrase, so it is counted twice
+            tokens = tokenize(question) * 2 + tokenize(answer)
+            self._doc_lengths.append(len(tokens))
+            self._total_length += len(tokens)
+
+            term_counts: dict[str, int] = {}
+            for token in tokens:
+                term_counts[token] = term_counts.get(token, 0) + 1
+            for term, count in term_counts.items():
+                docs, freqs = self._postings.setdefault(term, ([], []))
+                docs.append(doc_index)
+                freqs.append(count)
+
+    def _remove(self, doc_index: int):
+        old = self._entries[doc_index]
+        for term in set(tokenize(old["question"]) + tokenize(old["answer"])):
+            docs, freqs = self._postings[term]
+            position = docs.index(doc_index)
+            del docs[position]
+            del freqs[position]
+            if not docs:
+                del self._postings[term]
+        self._replaced.add(doc_index)
+        self._total_length -= self._doc_lengths[doc_index]
+
+    def search(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        min_score: Optional[float] = None,
+    ) -> List[dict]:
+        k = settings.RETRIEVAL_TOP_K if k is None else k
+        min_score = settings.RETRIEVAL_MIN_SCORE if min_score is None else min_score
+
+        with self._lock:
+            doc_count = len(self._entries)
+            live_count = len(self._positions)
+            if live_count == 0 or k <= 0:
+                return []
+
+            doc_lengths = np.asarray(self._doc_lengths, dtype=np.float64)
+            avg_length = self._total_length / live_count or 1.0
+            length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / avg_length)
+            scores = np.zeros(doc_count, dtype=np.float64)
+
+            for term in set(tokenize(query)):
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                docs = np.asarray(posting[0], dtype=np.intp)
+                freqs = np.asarray(posting[1], dtype=np.float64)
+                idf = np.log(1 + (live_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                scores[docs] += idf * freqs * (self.k1 + 1) / (freqs + length_norm[docs])
+
+            if self._replaced:
+                scores[list(self._replaced)] = -np.inf
+            candidates = np.flatnonzero(scores > min_score)
+            if candidates.size == 0:
+                return []
+            if candidates.size > k:
+                top = np.argpartition(scores[candidates], -k)[-k:]
+                candidates = candidates[top]
+            ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+            return [
+                {**self._entries[i], "score": float(scores[i])} for i in ranked
+            ]
+
+
+qa_index = QAIndex()
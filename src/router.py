@@ -1,13 +1,34 @@
-from typing import List
-from fastapi import APIRouter, Depends
-from fastapi import HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
-from src.database import get_db
-from src.entities import User, Message, QAEntry, UnansweredQuestion, Admin
-from src.models import UserCreate, MessageCreate, AdminCreate, QAEntryCreate, AdminLogin, AnswerQuestion, MessageResponse, UnansweredQuestionResponse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Request
+from fastapi import HTTPException, Depends, File, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import get_db, SessionLocal
+from src.entities import User, Message, MessageArchive, ConversationSummary, QAEntry, UnansweredQuestion, UnansweredCluster, Admin, OutboxEvent, IngestionJob
+from src.config import settings
+from src.models import UserCreate, MessageCreate, AdminCreate, QAEntryCreate, AdminLogin, AnswerQuestion, MessageResponse, UnansweredQuestionResponse, UnansweredClusterResponse, MessageArchiveResponse, OutboxEventResponse, IngestionJobResponse
 import uuid
-from src.bot_service import openrouter_service
-from src.admin_service import hash_password, verify_password, verify_token, create_access_token, send_email_notification
+from src.bot_service import openrouter_service, FALLBACK_RESPONSE, UNKNOWN_ANSWER_MARKER, IncompleteStreamError
+from src.knowledge_base import retrieve_qa_data, refresh_knowledge_base, bump_version, get_db_version, knowledge_base_status
+from src.clustering import resolve_cluster
+from src.response_cache import response_cache
+from src.pagination import PageParams, decode_cursor, encode_cursor, paginate
+from src.archive import archive_old_messages, export_messages, read_archived_messages
+from src.ingestion import detect_format, start_job
+from src.admin_service import hash_password, verify_password, verify_token, create_access_token
+from src.analytics import backfill_daily_stats, get_analytics, record_answers
+from src.direct_answer import direct_answer
+from src.rate_limit import limit_auth, limit_chat, llm_admission
+from src.outbox import EVENT_CHAT_EXCHANGE, EVENT_ESCALATION, outbox_event, outbox_worker
+from src.metrics import stage
+from src.summaries import schedule_summary_refresh
 from sqlalchemy.sql import func
 import logging
 from sqlalchemy import or_
@@ -16,11 +37,12 @@ logger = logging.getLogger(__name__)
 
 app_router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
-@app_router.post("/auth/student")
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.username == user.username).first()
+@app_router.post("/auth/student", dependencies=[Depends(limit_auth)])
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = await db.scalar(select(User).where(User.username == user.username))
     if existing_user:
         logger.error(f"Username {user.username} has been taken, please choose another one")
         raise HTTPException(status_code=400, detail=f"Username {user.username} has been taken, please choose another one")
@@ -33,84 +55,254 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
         is_existing_student=user.is_existing_student
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return {"data": db_user, "message": "User created successfully"}
 
-@app_router.post("/message")
-async def send_message(
-    message: MessageCreate,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
-):
-    user = db.query(User).filter(User.unique_identifier == message.user_identifier).first()
-    if not user:
+async def load_conversation(db: AsyncSession, message: MessageCreate):
+    """
+    Returns the user, the turns since their conversation summary (at most
+    CHAT_HISTORY_WINDOW, ending with the new message) and the summary text.
+    The new message itself is only persisted together with the bot reply in
+    record_bot_response.
+    """
+    with stage("user_lookup"):
+        row = (
+            await db.execute(
+                select(User, ConversationSummary)
+                .outerjoin(ConversationSummary, ConversationSummary.user_id == User.id)
+                .where(User.unique_identifier == message.user_identifier)
+            )
+        ).first()
+    if not row:
         logger.error("User not found")
         raise HTTPException(status_code=404, detail="User not found")
+    user, summary = row
     
+    # Served by ix_messages_user_id_created_at; newest first, then flipped back.
+    # Anything the summary already covers is left out.
+    with stage("history"):
+        messages = (
+            await db.scalars(
+                select(Message)
+                .where(Message.user_id == user.id, Message.id > (summary.last_message_id if summary else 0))
+                .order_by(Message.created_at.desc(), Message.id.desc())
+                .limit(max(settings.CHAT_HISTORY_WINDOW - 1, 0))
+            )
+        ).all()
+    conversation_history = [
+        {"role": "user" if not msg.is_bot else "assistant", "content": msg.content}
+        for msg in reversed(messages)
+    ]
+    conversation_history.append({"role": "user", "content": message.content})
+    return user, conversation_history, summary.summary if summary else None
+
+
+async def record_bot_response(
+    db: AsyncSession,
+    user_id: int,
+    question: str,
+    bot_response: str,
+    source: str = "llm"
+):
+    """
+    Persists the student's message and the reply in one commit, together with
+    outbox events for everything else that follows from them: escalating an
+    unanswered question, notifying admins and analytics. The outbox worker
+    carries those out after the response has gone back.
+    """
     user_message = Message(
-        user_id=user.id,
-        content=message.content,
+        user_id=user_id,
+        content=question,
         is_bot=False
     )
-    db.add(user_message)
-    db.commit()
+    bot_message = Message(
+        user_id=user_id,
+        content=bot_response,
+        is_bot=True
+    )
+    db.add_all([user_message, bot_message])
+    await db.flush()
     
-    messages = db.query(Message).filter(Message.user_id == user.id).order_by(Message.created_at).all()
-    conversation_history = [
-        {"role": "user" if not msg.is_bot else "assistant", "content": msg.content}
-        for msg in messages[-10:]
-    ]
+    is_unanswered = UNKNOWN_ANSWER_MARKER in bot_response
+    if is_unanswered:
+        outcome = "escalated"
+        db.add(outbox_event(
+            EVENT_ESCALATION,
+            f"escalate:{user_message.id}",
+            {"user_id": user_id, "question": question, "message_id": user_message.id}
+        ))
+    else:
+        outcome = "fallback" if bot_response == FALLBACK_RESPONSE else "answered"
+    db.add(outbox_event(
+        EVENT_CHAT_EXCHANGE,
+        f"exchange:{bot_message.id}",
+        {
+            "user_id": user_id,
+            "message_id": user_message.id,
+            "reply_id": bot_message.id,
+            "outcome": outcome,
+            "source": source,
+            "day": date.today().isoformat(),
+        }
+    ))
+    await db.commit()
+    outbox_worker.notify()
+
+
+@app_router.post("/message")
+async def send_message(
+    message: MessageCreate,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    limit_chat(request, message.user_identifier)
+    user, conversation_history, summary = await load_conversation(db, message)
     
-    qa_entries = db.query(QAEntry).all()
-    qa_data = [{"question": qa.question, "answer": qa.answer} for qa in qa_entries]
+    with stage("cache_lookup"):
+        bot_response = response_cache.get(message.content)
+    source = "cache"
+    if bot_response is None:
+        with stage("retrieve"):
+            qa_data = await retrieve_qa_data(db, message.content)
+        with stage("direct_answer"):
+            bot_response = direct_answer(message.content, qa_data)
+        source = "fast_path"
+    if bot_response is None:
+        source = "llm"
+        # Hand the connection back to the pool while the LLM call is in flight
+        await db.close()
+        bot_response = await openrouter_service.generate_shared_response(conversation_history, qa_data, summary)
+        if bot_response != FALLBACK_RESPONSE:
+            response_cache.set(message.content, bot_response)
     
-    bot_response = await openrouter_service.generate_response(conversation_history, qa_data)
+    with stage("record"):
+        await record_bot_response(db, user.id, message.content, bot_response, source)
+    # The new message and the reply are now past the summary as well
+    schedule_summary_refresh(user.id, len(conversation_history) + 1)
     
-    if "I don't know the answer to that question yet" in bot_response:
-        logger.info(f"New unanswered question: {message.content}")
-        unanswered = UnansweredQuestion(
-            question=message.content,
-            user_id=user.id
-        )
-        db.add(unanswered)
-        db.commit()
+    return {"response": bot_response}
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def iter_once(value: str):
+    yield value
+
+
+@app_router.post("/message/stream")
+async def stream_message(
+    message: MessageCreate,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Same as POST /message, but the reply is sent as Server-Sent Events: one
+    `token` event per chunk from the model, then a `done` event carrying the
+    full response and the time to first token. If the model's stream breaks
+    off part way, an `error` event is sent instead of `done` and nothing is
+    saved.
+    """
+    limit_chat(request, message.user_identifier)
+    user, conversation_history, summary = await load_conversation(db, message)
+    user_id = user.id
+    
+    with stage("cache_lookup"):
+        ready_response = response_cache.get(message.content)
+    source = "cache"
+    qa_data, admitted_at = [], None
+    if ready_response is None:
+        with stage("retrieve"):
+            qa_data = await retrieve_qa_data(db, message.content)
+        with stage("direct_answer"):
+            ready_response = direct_answer(message.content, qa_data)
+        source = "fast_path"
+    if ready_response is None:
+        source = "llm"
+        # Admitted here so an overloaded worker can still answer 503 instead
+        # of starting the stream; the slot is released once the model is done
+        admitted_at = await llm_admission.acquire()
+        # Whoever held the slot we waited for may have just answered this
+        ready_response = response_cache.get(message.content)
+        if ready_response is not None:
+            llm_admission.release(admitted_at)
+            source, admitted_at = "cache", None
+    
+    async def event_stream():
+        started = time.perf_counter()
+        ttft_ms = None
+        chunks = []
         
-        background_tasks.add_task(
-            send_email_notification,
-            "New Unanswered Question",
-            f"A student asked: {message.content}\n\nPlease log into the admin dashboard to provide an answer."
-        )
-        logger.info("Unanswered question sent to admin")
+        if ready_response is not None:
+            tokens = iter_once(ready_response)
+        else:
+            tokens = openrouter_service.stream_response(conversation_history, qa_data, summary)
+        
+        try:
+            async for token in tokens:
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                chunks.append(token)
+                yield sse_event("token", {"content": token})
+        except IncompleteStreamError:
+            # A truncated reply is neither cached nor saved; the student can ask again
+            logger.warning(f"Stream for user {user_id} broke off after {len(chunks)} chunks")
+            yield sse_event("error", {"detail": "The response was interrupted, please try again"})
+            return
+        finally:
+            if admitted_at is not None:
+                llm_admission.release(admitted_at)
+        
+        bot_response = "".join(chunks)
+        total_ms = (time.perf_counter() - started) * 1000
+        if ttft_ms is None:
+            ttft_ms = total_ms
+        logger.info(f"Streamed response: ttft={ttft_ms:.1f}ms total={total_ms:.1f}ms")
+        
+        if source == "llm" and bot_response != FALLBACK_RESPONSE:
+            response_cache.set(message.content, bot_response)
+        
+        # The request-scoped session is already closed once the body streams
+        async with SessionLocal() as stream_db:
+            await record_bot_response(stream_db, user_id, message.content, bot_response, source)
+        schedule_summary_refresh(user_id, len(conversation_history) + 1)
+        
+        yield sse_event("done", {"response": bot_response, "ttft_ms": ttft_ms, "total_ms": total_ms})
     
-    bot_message = Message(
-        user_id=user.id,
-        content=bot_response,
-        is_bot=True
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    db.add(bot_message)
-    db.commit()
-    
-    return {"response": bot_response}
 
 @app_router.get("/messages/{user_identifier}")
-async def get_messages(user_identifier: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(
-        or_(
-            User.username == user_identifier,
-            User.unique_identifier == user_identifier
+async def get_messages(
+    user_identifier: str,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Returns the newest `limit` messages in chronological order. Pass the
+    returned `next_cursor` back as `cursor` to page towards older messages;
+    once the messages table runs out, pages continue into archived history.
+    """
+    user = await db.scalar(
+        select(User).where(
+            or_(
+                User.username == user_identifier,
+                User.unique_identifier == user_identifier
+            )
         )
-    ).first()
+    )
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    messages = (
-        db.query(Message)
-        .filter(Message.user_id == user.id)
-        .order_by(Message.created_at)
-        .all()
+    messages, next_cursor = await paginate(
+        db, select(Message).where(Message.user_id == user.id), Message, page
     )
     
     data = [
@@ -122,25 +314,39 @@ async def get_messages(user_identifier: str, db: Session = Depends(get_db)):
         )
         for msg in messages
     ]
-    return {"data": data, "message": "Messages fetched successfully"}
+    
+    if next_cursor is None:
+        # Only reached when paging past the live table, so archives are read on demand
+        if messages:
+            before = (messages[-1].created_at, messages[-1].id)
+        else:
+            before = decode_cursor(page.cursor) if page.cursor else None
+        remaining = page.limit - len(data)
+        archived = await read_archived_messages(db, user.id, before, remaining + 1)
+        data.extend(MessageResponse(**row) for row in archived[:remaining])
+        if len(archived) > remaining:
+            next_cursor = encode_cursor(data[-1].created_at, data[-1].id)
+    
+    data.reverse()
+    return {"data": data, "next_cursor": next_cursor, "message": "Messages fetched successfully"}
 
-@app_router.post("/auth/admin/register")
-async def register_admin(admin: AdminCreate, db: Session = Depends(get_db)):
-    existing_admin = db.query(Admin).filter(Admin.email == admin.email).first()
+@app_router.post("/auth/admin/register", dependencies=[Depends(limit_auth)])
+async def register_admin(admin: AdminCreate, db: AsyncSession = Depends(get_db)):
+    existing_admin = await db.scalar(select(Admin).where(Admin.email == admin.email))
     if existing_admin:
         raise HTTPException(status_code=400, detail="Admin already exists")
     
-    hashed_password = hash_password(admin.password)
+    hashed_password = await hash_password(admin.password)
     db_admin = Admin(email=admin.email, password_hash=hashed_password)
     db.add(db_admin)
-    db.commit()
+    await db.commit()
     
     return {"message": "Admin registered successfully"}
 
-@app_router.post("/auth/admin/login")
-async def login_admin(admin: AdminLogin, db: Session = Depends(get_db)):
-    db_admin = db.query(Admin).filter(Admin.email == admin.email).first()
-    if not db_admin or not verify_password(admin.password, db_admin.password_hash):
+@app_router.post("/auth/admin/login", dependencies=[Depends(limit_auth)])
+async def login_admin(admin: AdminLogin, db: AsyncSession = Depends(get_db)):
+    db_admin = await db.scalar(select(Admin).where(Admin.email == admin.email))
+    if not db_admin or not await verify_password(admin.password, db_admin.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_access_token({"sub": admin.email, "type": "admin"})
@@ -154,24 +360,91 @@ async def login_admin(admin: AdminLogin, db: Session = Depends(get_db)):
 
 @app_router.get("/admin/unanswered-questions")
 async def get_unanswered_questions(
+    page: PageParams = Depends(),
     token_data: dict = Depends(verify_token),
-    db: Session = Depends(get_db)
-):
-    questions = db.query(UnansweredQuestion).filter(
-        UnansweredQuestion.is_answered == False
-    ).order_by(UnansweredQuestion.created_at.desc()).all()
-    
-    unanswererd_questions = [
-        UnansweredQuestionResponse(
-            id=q.id,
-            question=q.question,
-            user_id=q.user_id,
-            created_at=q.created_at,
-            is_answered=q.is_answered
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Lists open clusters of similar unanswered questions with how many times
+    each was asked. Members of a cluster are listed by
+    GET /admin/unanswered-clusters/{cluster_id}.
+    """
+    clusters, next_cursor = await paginate(
+        db,
+        select(UnansweredCluster).where(UnansweredCluster.is_answered == False),
+        UnansweredCluster,
+        page
+    )
+    
+    unanswered_clusters = [
+        UnansweredClusterResponse(
+            id=c.id,
+            question=c.question,
+            question_count=c.question_count,
+            created_at=c.created_at,
+            updated_at=c.updated_at,
+            is_answered=c.is_answered
         )
-        for q in questions
+        for c in clusters
     ]
-    return {"data": unanswererd_questions, "message": "Unanswered questions fetched successfully"}
+    return {
+        "data": unanswered_clusters,
+        "next_cursor": next_cursor,
+        "message": "Unanswered questions fetched successfully"
+    }
+
+
+@app_router.get("/admin/unanswered-clusters/{cluster_id}")
+async def get_unanswered_cluster(
+    cluster_id: int,
+    page: PageParams = Depends(),
+    token_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    cluster = await db.get(UnansweredCluster, cluster_id)
+    if not cluster:
+        raise HTTPException(status_code=404, detail="Cluster not found")
+    
+    questions, next_cursor = await paginate(
+        db,
+        select(UnansweredQuestion).where(UnansweredQuestion.cluster_id == cluster_id),
+        UnansweredQuestion,
+        page
+    )
+    
+    data = {
+        "cluster": cluster,
+        "questions": [
+            UnansweredQuestionResponse(
+                id=q.id,
+                question=q.question,
+                user_id=q.user_id,
+                created_at=q.created_at,
+                is_answered=q.is_answered,
+                cluster_id=q.cluster_id
+            )
+            for q in questions
+        ]
+    }
+    return {"data": data, "next_cursor": next_cursor, "message": "Cluster fetched successfully"}
+
+
+@app_router.post("/admin/unanswered-clusters/{cluster_id}/answer")
+async def answer_cluster(
+    cluster_id: int,
+    answer_data: AnswerQuestion,
+    token_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    cluster = await db.get(UnansweredCluster, cluster_id)
+    if not cluster:
+        logger.error(f"Cluster with {cluster_id} not found")
+        raise HTTPException(status_code=404, detail="Cluster not found")
+    if cluster.is_answered:
+        raise HTTPException(status_code=400, detail="Cluster already answered")
+    
+    cluster = await resolve_cluster(db, cluster, answer_data.answer)
+    return {"data": cluster, "message": "Cluster answered successfully"}
 
 
 @app_router.post("/admin/answer-question/{question_id}")
@@ -179,43 +452,57 @@ async def answer_question(
     question_id: int,
     answer_data: AnswerQuestion,
     token_data: dict = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    question = db.query(UnansweredQuestion).filter(UnansweredQuestion.id == question_id).first()
+    question = await db.get(UnansweredQuestion, question_id)
     if not question:
         logger.error(f"Question with {question_id} not found")
         raise HTTPException(status_code=404, detail="Question not found")
     
+    # Answering any question of an open cluster answers the whole cluster
+    cluster = await db.get(UnansweredCluster, question.cluster_id) if question.cluster_id else None
+    if cluster and not cluster.is_answered:
+        await resolve_cluster(db, cluster, answer_data.answer)
+        await db.refresh(question)
+        return {"data": question, "message": "Question answered successfully"}
+    
     question.answer = answer_data.answer
     question.is_answered = True
     question.answered_at = func.now()
+    await db.flush()
+    await db.refresh(question, ["created_at", "answered_at"])
+    await record_answers(db, [(question.created_at, question.answered_at)])
     
     qa_entry = QAEntry(
         question=question.question,
         answer=answer_data.answer
     )
     db.add(qa_entry)
-    db.commit()
+    version = await bump_version(db)
+    await db.commit()
+    await db.refresh(question)
+    refresh_knowledge_base([{"id": qa_entry.id, "question": qa_entry.question, "answer": qa_entry.answer}], version)
     
     return {"data": question, "message": "Question answered successfully"}
 
 
 @app_router.get("/admin/qa-entries")
 async def get_qa_entries(
+    page: PageParams = Depends(),
     token_data: dict = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    entries = db.query(QAEntry).order_by(QAEntry.created_at.desc()).all()
-    return {"data": entries, "message": "QA entries fetched successfully"}
+    entries, next_cursor = await paginate(db, select(QAEntry), QAEntry, page)
+    return {"data": entries, "next_cursor": next_cursor, "message": "QA entries fetched successfully"}
 
 
 @app_router.get("/admin/unanswered-questions/{question_id}")
 async def get_unanswered_question(
     question_id: int,
     token_data: dict = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    question = db.query(UnansweredQuestion).filter(UnansweredQuestion.id == question_id).first()
+    question = await db.get(UnansweredQuestion, question_id)
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
     
@@ -223,9 +510,194 @@ async def get_unanswered_question(
 
 
 @app_router.post("/admin/qa-entries")
-async def create_qa_entries(qa_entries: List[QAEntryCreate], token_data: dict = Depends(verify_token), db: Session = Depends(get_db)):
-    for entry in qa_entries:
-        qa_entry = QAEntry(question=entry.question, answer=entry.answer)
-        db.add(qa_entry)
-    db.commit()
-    return {"data": qa_entries, "message": "QA entries created successfully"}
\ No newline at end of file
+async def create_qa_entries(qa_entries: List[QAEntryCreate], token_data: dict = Depends(verify_token), db: AsyncSession = Depends(get_db)):
+    db_entries = [QAEntry(question=entry.question, answer=entry.answer) for entry in qa_entries]
+    db.add_all(db_entries)
+    version = await bump_version(db)
+    await db.commit()
+    refresh_knowledge_base([{"id": qa.id, "question": qa.question, "answer": qa.answer} for qa in db_entries], version)
+    return {"data": qa_entries, "message": "QA entries created successfully"}
+
+
+@app_router.put("/admin/qa-entries/{entry_id}")
+async def update_qa_entry(
+    entry_id: int,
+    entry: QAEntryCreate,
+    token_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    qa_entry = await db.get(QAEntry, entry_id)
+    if not qa_entry:
+        raise HTTPException(status_code=404, detail="QA entry not found")
+    
+    qa_entry.question = entry.question
+    qa_entry.answer = entry.answer
+    version = await bump_version(db)
+    await db.commit()
+    await db.refresh(qa_entry)
+    refresh_knowledge_base([{"id": qa_entry.id, "question": qa_entry.question, "answer": qa_entry.answer}], version)
+    return {"data": qa_entry, "message": "QA entry updated successfully"}
+
+
+@app_router.get("/admin/knowledge-base")
+async def get_knowledge_base_status(
+    token_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Reports the knowledge-base version this worker serves next to the one in
+    the database, so a stale worker can be spotted.
+    """
+    status = knowledge_base_status()
+    status["db_version"] = await get_db_version(db)
+    status["stale"] = status["db_version"] != status["version"]
+    return {"data": status, "message": "Knowledge base status fetched successfully"}
+
+
+@app_router.post("/admin/qa-entries/upload", status_code=202)
+async def upload_qa_entries(
+    file: UploadFile = File(...),
+    token_data: dict = Depends(verify_token)
+):
+    """
+    Bulk-imports QA entries from a CSV (question/answer columns), JSONL or PDF
+    file. Parsing and inserts happen in the background; poll
+    GET /admin/ingestion-jobs/{job_id} for progress.
+    """
+    file_format = detect_format(file.filename)
+    if file_format is None:
+        raise HTTPException(status_code=400, detail="Only .csv, .jsonl and .pdf files are supported")
+    
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(file.filename)[1])
+    with os.fdopen(fd, "wb") as upload:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await asyncio.to_thread(upload.write, chunk)
+    
+    job = await start_job(file.filename, file_format, path)
+    logger.info(f"Started ingestion job {job.id} for {file.filename}")
+    data = IngestionJobResponse.model_validate(job, from_attributes=True)
+    return {"data": data, "message": "Ingestion job started"}
+
+
+@app_router.get("/admin/ingestion-jobs/{job_id}")
+async def get_ingestion_job(
+    job_id: str,
+    token_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    job = await db.get(IngestionJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    
+    data = IngestionJobResponse.model_validate(job, from_attributes=True)
+    return {"data": data, "message": "Ingestion job fetched successfully"}
+
+
+@app_router.post("/admin/messages/archive")
+async def archive_messages(token_data: dict = Depends(verify_token)):
+    """Moves messages older than MESSAGE_RETENTION_DAYS into Parquet archives now."""
+    result = await archive_old_messages()
+    return {"data": result, "message": "Messages archived successfully"}
+
+
+@app_router.get("/admin/message-archives")
+async def get_message_archives(
+    page: PageParams = Depends(),
+    token_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    archives, next_cursor = await paginate(db, select(MessageArchive), MessageArchive, page)
+    data = [MessageArchiveResponse.model_validate(archive, from_attributes=True) for archive in archives]
+    return {"data": data, "next_cursor": next_cursor, "message": "Message archives fetched successfully"}
+
+
+@app_router.get("/admin/messages/export")
+async def export_archived_messages(
+    include_live: bool = False,
+    token_data: dict = Depends(verify_token)
+):
+    """
+    Streams archived messages as JSON lines, read from the Parquet files a
+    batch at a time. include_live=true appends the messages still in the
+    database.
+    """
+    return StreamingResponse(
+        export_messages(include_live),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="messages.jsonl"'},
+    )
+
+
+@app_router.get("/admin/analytics")
+async def get_admin_analytics(
+    days: int = Query(settings.ANALYTICS_DEFAULT_DAYS, ge=1, le=settings.ANALYTICS_MAX_DAYS),
+    token_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Dashboard figures for the last `days` days: questions, escalations and
+    active students per day, time-to-answer for escalated questions, and the
+    most-asked open unanswered clusters. Read from rollup tables kept up to
+    date as messages are processed and questions answered.
+    """
+    return {"data": await get_analytics(db, days), "message": "Analytics fetched successfully"}
+
+
+@app_router.post("/admin/analytics/backfill")
+async def backfill_analytics(
+    token_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """One-off: computes the rollups for days from before they were collected."""
+    days = await backfill_daily_stats(db)
+    return {"data": {"days": days}, "message": "Analytics backfilled successfully"}
+
+
+@app_router.get("/admin/outbox-events")
+async def get_outbox_events(
+    status: Optional[str] = None,
+    page: PageParams = Depends(),
+    token_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    stmt = select(OutboxEvent)
+    if status:
+        stmt = stmt.where(OutboxEvent.status == status)
+    events, next_cursor = await paginate(db, stmt, OutboxEvent, page)
+    data = [OutboxEventResponse.model_validate(event, from_attributes=True) for event in events]
+    return {"data": data, "next_cursor": next_cursor, "message": "Outbox events fetched successfully"}
+
+
+@app_router.post("/admin/outbox-events/{event_id}/retry")
+async def retry_outbox_event(
+    event_id: int,
+    token_data: dict = Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Puts a failed event back in the queue with a fresh set of attempts."""
+    result = await db.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id == event_id, OutboxEvent.status == "failed")
+        .values(status="pending", attempts=0, available_at=datetime.now())
+    )
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Failed outbox event not found")
+    await db.commit()
+    outbox_worker.notify()
+    return {"data": None, "message": "Outbox event queued for retry"}
+
+
+@app_router.get("/admin/llm-models")
+async def get_llm_models(token_data: dict = Depends(verify_token)):
+    return {"data": openrouter_service.router.status(), "message": "Model stats fetched successfully"}
+
+
+@app_router.get("/admin/cache-stats")
+async def get_cache_stats(token_data: dict = Depends(verify_token)):
+    stats = {
+        **response_cache.stats(),
+        "llm_calls_coalesced": openrouter_service.single_flight.coalesced,
+        "llm_calls_in_flight": openrouter_service.single_flight.in_flight(),
+        "llm_admission": llm_admission.stats(),
+    }
+    return {"data": stats, "message": "Cache stats fetched successfully"}
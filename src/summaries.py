@@ -0,0 +1,121 @@
+import asyncio
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.bot_service import openrouter_service
+from src.config import settings
+from src.database import SessionLocal
+from src.entities import ConversationSummary, Message
+from src.metrics import SUMMARY_REFRESHES
+import logging
+
+logger = logging.getLogger(__name__)
+
+_refreshing: set[int] = set()
+_tasks: set = set()
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+async def get_summary(db: AsyncSession, user_id: int) -> Optional[ConversationSummary]:
+    return await db.scalar(select(ConversationSummary).where(ConversationSummary.user_id == user_id))
+
+
+def refresh_threshold() -> int:
+    # History reads are capped at CHAT_HISTORY_WINDOW, so a larger threshold would never be seen
+    return min(
+        settings.SUMMARY_KEEP_RECENT_MESSAGES + settings.SUMMARY_REFRESH_EVERY,
+        settings.CHAT_HISTORY_WINDOW,
+    )
+
+
+def schedule_summary_refresh(user_id: int, unsummarized_count: int):
+    """
+    Starts a background refresh once the user has enough messages past their
+    summary. Returns straight away; at most one refresh per user runs at once.
+    """
+    if unsummarized_count < refresh_threshold() or user_id in _refreshing:
+        return
+    _refreshing.add(user_id)
+    task = asyncio.create_task(refresh_summary(user_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def refresh_summary(user_id: int):
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.SUMMARY_MAX_CONCURRENCY)
+    try:
+        async with _semaphore:
+            outcome = await _refresh_summary(user_id)
+        SUMMARY_REFRESHES.inc(outcome=outcome)
+    except Exception as e:
+        SUMMARY_REFRESHES.inc(outcome="error")
+        logger.error(f"Summary refresh for user {user_id} failed: {e}")
+    finally:
+        _refreshing.discard(user_id)
+
+
+async def _refresh_summary(user_id: int) -> str:
+    async with SessionLocal() as db:
+        summary = await get_summary(db, user_id)
+        after_id = summary.last_message_id if summary else 0
+        messages = (
+            await db.scalars(
+                select(Message)
+                .where(Message.user_id == user_id, Message.id > after_id)
+                .order_by(Message.id.desc())
+                .limit(settings.SUMMARY_KEEP_RECENT_MESSAGES + settings.SUMMARY_MAX_INPUT_MESSAGES)
+            )
+        ).all()
+    # The newest messages stay verbatim in the prompt; only older ones are folded in
+    older = list(reversed(messages[settings.SUMMARY_KEEP_RECENT_MESSAGES:]))
+    if not older:
+        return "skipped"
+
+    text = await openrouter_service.summarize(
+        summary.summary if summary else None,
+        [{"role": "assistant" if msg.is_bot else "user", "content": msg.content} for msg in older],
+    )
+    if not text:
+        return "error"
+
+    last_message_id = older[-1].id
+    async with SessionLocal() as db:
+        if summary is None:
+            db.add(ConversationSummary(
+                user_id=user_id,
+                summary=text,
+                last_message_id=last_message_id,
+                message_count=len(older),
+            ))
+            try:
+                await db.commit()
+            except IntegrityError:
+                # Another worker summarized this user first
+                return "conflict"
+        else:
+            result = await db.execute(
+                update(ConversationSummary)
+                .where(ConversationSummary.id == summary.id, ConversationSummary.last_message_id == after_id)
+                .values(
+                    summary=text,
+                    last_message_id=last_message_id,
+                    message_count=ConversationSummary.message_count + len(older),
+                )
+            )
+            await db.commit()
+            if not result.rowcount:
+                return "conflict"
+
+    logger.info(f"Summarized {len(older)} messages for user {user_id}")
+    return "updated"
+
+
+async def stop_summary_refreshes():
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from sqlalchemy import text
+
+from src.bot_service import openrouter_service
+from src.clustering import load_cluster_index
+from src.config import settings
+from src.database import SessionLocal, engine, init_models
+from src.knowledge_base import load_knowledge_base
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupState:
+    def __init__(self):
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.steps: dict[str, float] = {}
+        self.attempts = 0
+        # Step and error of the last failed attempt, cleared once warm-up succeeds
+        self.failed_step: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "warmup_seconds": round(self.duration, 3) if self.duration is not None else None,
+            "steps": {name: round(seconds, 3) for name, seconds in self.steps.items()},
+            "attempts": self.attempts,
+            "failed_step": self.failed_step,
+            "last_error": self.last_error,
+        }
+
+
+warmup_state = WarmupState()
+
+
+@asynccontextmanager
+async def _step(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        warmup_state.failed_step = name
+        raise
+    warmup_state.steps[name] = time.perf_counter() - started
+
+
+async def _open_connection():
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def _warm_db_pool():
+    # Opened side by side so the pool keeps that many idle connections afterwards
+    if engine.dialect.name == "sqlite":
+        count = 1
+    else:
+        count = max(1, min(settings.DB_WARMUP_CONNECTIONS, settings.DB_POOL_SIZE))
+    await asyncio.gather(*(_open_connection() for _ in range(count)))
+
+
+async def _warm_http_client():
+    await openrouter_service.start()
+    try:
+        # Any response will do; this only sets up the TCP/TLS connection for the first real call
+        await openrouter_service.client.head(
+            openrouter_service.base_url, timeout=settings.OPENROUTER_CONNECT_TIMEOUT
+        )
+    except Exception as e:
+        logger.warning(f"Could not pre-connect to OpenRouter: {e!r}")
+
+
+async def warm_up():
+    """
+    Gets the worker ready for traffic: creates the schema, fills the DB pool,
+    connects to OpenRouter and loads the knowledge base and cluster index.
+    /readyz reports ready once this returns.
+    """
+    warmup_state.started_at = time.perf_counter()
+    warmup_state.attempts += 1
+    warmup_state.steps = {}
+    async with _step("schema"):
+        await init_models()
+    async with _step("db_pool"):
+        await _warm_db_pool()
+    async with _step("http_client"):
+        await _warm_http_client()
+    async with _step("knowledge_base"):
+        async with SessionLocal() as db:
+            await load_knowledge_base(db)
+            await load_cluster_index(db)
+
+    warmup_state.duration = time.perf_counter() - warmup_state.started_at
+    warmup_state.failed_step = warmup_state.last_error = None
+    warmup_state.ready = True
+    logger.info(
+        f"Warm-up finished in {warmup_state.duration * 1000:.1f}ms: "
+        + " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in warmup_state.steps.items())
+    )
+
+
+async def warm_up_until_ready():
+    """
+    Runs warm_up() until it succeeds, backing off between attempts. Meant to
+    run in the background after startup: the worker stays live, and /readyz
+    reports the failing step, while e.g. the database is unreachable.
+    """
+    while True:
+        try:
+            await warm_up()
+            return
+        except Exception as e:
+            warmup_state.last_error = repr(e)
+            delay = min(
+                settings.WARMUP_RETRY_BACKOFF_SECONDS * 2 ** (warmup_state.attempts - 1),
+                settings.WARMUP_RETRY_MAX_BACKOFF_SECONDS,
+            )
+            logger.error(
+                f"Warm-up attempt {warmup_state.attempts} failed at {warmup_state.failed_step}: {e!r}; "
+                f"retrying in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)